@@ -1,16 +1,272 @@
-# This is a sample Python script.
+import argparse
+from datetime import datetime
+from pathlib import Path
+import sys
 
-# Press Shift+F10 to execute it or replace it with your code.
-# Press Double Shift to search everywhere for classes, files, tool windows, actions, and settings.
+#
+# headless entry point for scheduled processing of new exports.  It never imports PySimpleGUIQt and selects a
+# non-interactive matplotlib backend, the data and chart modules are only imported by the command that needs
+# them so that `list` and `--help` start quickly.
+#
+sys.path.insert(0, Path(__file__).parent.joinpath('src').__str__())
 
+TEMP_SOURCE_NWS = 'nws'
+TEMP_SOURCE_SC_ACIS = 'acis'
+TEMP_SOURCE_LOCAL = 'local'
+TEMP_SOURCES: list[str] = [TEMP_SOURCE_NWS, TEMP_SOURCE_SC_ACIS, TEMP_SOURCE_LOCAL]
+GRAPH_DAILY = 'daily'
+GRAPH_HOURLY = 'hourly'
 
-def print_hi(name):
-    # Use a breakpoint in the code line below to debug your script.
-    print(f'Hi, {name}')  # Press Ctrl+8 to toggle the breakpoint.
 
+def iso_date(value: str) -> datetime:
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'{value} is not a YYYY-MM-DD date.')
 
-# Press the green button in the gutter to run the script.
-if __name__ == '__main__':
-    print_hi('PyCharm')
 
-# See PyCharm help at https://www.jetbrains.com/help/pycharm/
+def load_temperatures(temp_path: Path | None, temp_source: str, from_date: datetime, to_date: datetime):
+    from data_cruncher.temperature_data import (TemperatureData, TemperatureDataFactory, AVE_TEMP_COL, DATE_COL,
+                                                MAX_TEMP_COL, MIN_TEMP_COL)
+    import pandas as pd
+
+    if temp_path is None:
+        # no temperatures, the daily usage gets the temperature columns with every day missing
+        return TemperatureData(source='None',
+                               data_frame=pd.DataFrame({DATE_COL: pd.Series(dtype='datetime64[ns]'),
+                                                        **{column: pd.Series(dtype='float64')
+                                                           for column in [MIN_TEMP_COL, MAX_TEMP_COL, AVE_TEMP_COL]}}),
+                               from_date=from_date, to_date=to_date)
+    if temp_source == TEMP_SOURCE_NWS:
+        return TemperatureDataFactory.from_nws_spreadsheet(temp_path, from_date, to_date)
+    if temp_source == TEMP_SOURCE_SC_ACIS:
+        return TemperatureDataFactory.from_sc_acis_files(temp_path, from_date, to_date)
+    return TemperatureDataFactory.from_local(temp_path, from_date, to_date)
+
+
+def ingest(args: argparse.Namespace) -> int:
+    from data_cruncher.batch_ingest import batch_ingest, export_paths
+    from data_cruncher.rollups import UsageRollups
+    from data_cruncher.temperature_store import TemperatureStore
+
+    hourly_usage_paths = export_paths(args.workbooks)
+    if len(hourly_usage_paths) == 0:
+        print('No usage workbooks found.')
+        return 1
+    # without a range the temperatures are kept for whatever days the workbooks hold
+    from_date = datetime.min if args.from_date is None else args.from_date
+    to_date = datetime.max if args.to_date is None else args.to_date
+    new_temp_data = load_temperatures(args.temps, args.temp_source, from_date, to_date)
+    # new temperatures join those already stored, the usage takes each day from the preferred source
+    temperature_store = TemperatureStore(args.datastore)
+    daily_temp_data = new_temp_data
+    if args.temps is not None or len(temperature_store.sources()) > 0:
+        daily_temp_data = temperature_store.temperature_data(args.from_date, args.to_date,
+                                                             incoming=None if args.temps is None else new_temp_data)
+    appended = batch_ingest(args.datastore, hourly_usage_paths, daily_temp_data, args.from_date, args.to_date,
+                            args.overlap, args.jobs, args.split_meters,
+                            UsageRollups(args.datastore, billing_day=args.billing_day), args.backend)
+    # the new temperatures are only stored once the usage went in, a failed ingest leaves the store as it was
+    if args.temps is not None:
+        temperature_store.put(new_temp_data)
+    print(f'{len(hourly_usage_paths)} workbooks ingested.')
+    for key, rows in appended.items():
+        print(f'{key:<32} {rows:>9} rows appended')
+    return 0
+
+
+def temps(args: argparse.Namespace) -> int:
+    from data_cruncher.temperature_store import TemperatureStore, SOURCE_COL
+
+    temperature_store = TemperatureStore(args.datastore)
+    if args.temps is not None:
+        daily_temp_data = load_temperatures(args.temps, args.temp_source, datetime.min, datetime.max)
+        print(f'{temperature_store.put(daily_temp_data)} {daily_temp_data.source} days stored.')
+    range_df = temperature_store.range(args.from_date, args.to_date)
+    for source, days in range_df[SOURCE_COL].value_counts().reindex(temperature_store.sources()).dropna().items():
+        print(f'{source:<32} {days:>9.0f} days used')
+    return 0
+
+
+def merge(args: argparse.Namespace) -> int:
+    from data_cruncher.usage_data import DailyUsageDataFactory, HourlyUsageDataFactory
+
+    factory = HourlyUsageDataFactory if args.kind == GRAPH_HOURLY else DailyUsageDataFactory
+    merged = factory.from_datastore_merged(args.datastore, args.names)
+    merged.save(args.datastore)
+    print(f'{", ".join(args.names)} merged into {merged.name}.')
+    return 0
+
+
+def list_frames(args: argparse.Namespace) -> int:
+    from data_cruncher.catalog import DataStoreCatalog
+
+    catalog = DataStoreCatalog(args.datastore)
+    if not catalog.exists():
+        catalog.rebuild()
+    for key in catalog.keys(kind=args.kind):
+        entry = catalog.get(key)
+        print(f'{entry.key:<32} {entry.kind:<7} {entry.from_date:%m/%d/%Y} {entry.to_date:%m/%d/%Y} '
+              f'{entry.rows:>9} {entry.source or ""}')
+    return 0
+
+
+def report(args: argparse.Namespace) -> int:
+    from data_cruncher.rollups import UsageRollups, PERIOD_DAILY
+    from data_cruncher.usage_data import HOURLY_SERIES, meter_series
+
+    series = HOURLY_SERIES if args.meter is None else meter_series(HOURLY_SERIES, args.meter)
+    rollups = UsageRollups(args.datastore, billing_day=args.billing_day, series=series)
+    if not rollups.exists():
+        # stores ingested with --split-meters hold a series for each meter rather than the continuous one
+        print(f'{args.datastore} holds no {series} series, name one of its meters with --meter.')
+        return 1
+    if args.rebuild or len(rollups.totals(PERIOD_DAILY)) == 0:
+        rollups.rebuild()
+    totals_df = rollups.totals(args.period, args.from_date, args.to_date)
+    if args.csv:
+        totals_df.to_csv(sys.stdout, index=False, date_format='%Y-%m-%d', float_format='%.2f')
+    else:
+        for row in totals_df.itertuples(index=False):
+            print(f'{row.Date:%m/%d/%Y} {row.total:>10.2f} kWh {row.days:>4} days')
+    return 0
+
+
+def fit(args: argparse.Namespace) -> int:
+    from data_cruncher.degree_days import degree_day_cache
+    from data_cruncher.usage_data import DAILY_SERIES
+
+    name = DAILY_SERIES if args.name is None else args.name
+    fits_df = degree_day_cache.rolling_fits(args.datastore, name, args.window, args.step, args.from_date, args.to_date)
+    if args.csv:
+        fits_df.to_csv(sys.stdout, index=False, date_format='%Y-%m-%d', float_format='%.4f')
+    else:
+        for row in fits_df.itertuples(index=False):
+            print(f'{row.from_date:%m/%d/%Y} {row.to_date:%m/%d/%Y} {row.base_load:>8.2f} kWh/day '
+                  f'{row.heating_slope:>6.3f} below {row.heating_base:.0f} {row.cooling_slope:>6.3f} above '
+                  f'{row.cooling_base:.0f} r2 {row.r_squared:.3f} {row.days:>5.0f} days')
+    return 0
+
+
+def render(args: argparse.Namespace) -> int:
+    # the backend must be selected before pyplot is first imported
+    import matplotlib
+    matplotlib.use('Agg')
+    from data_cruncher.usage_data import (DAILY_SERIES, HOURLY_SERIES, DailyUsageDataFactory,
+                                          HourlyUsageDataFactory)
+    from data_cruncher.tracing import span
+    from visualization.data_type import DataType
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=(args.width, args.height))
+    if args.graph == GRAPH_HOURLY:
+        from visualization.hourly_usage_graph import HourlyUsageGraph
+
+        name = HOURLY_SERIES if args.name is None else args.name
+        usage_data = HourlyUsageDataFactory.from_datastore(args.datastore, name, args.from_date, args.to_date)
+        HourlyUsageGraph(usage_data=usage_data, axes=fig.subplots(),
+                         show=tuple(DataType[show.upper()] for show in args.show))
+    else:
+        from visualization.daily_usage_graph import DailyUsageGraph
+
+        name = DAILY_SERIES if args.name is None else args.name
+        usage_data = DailyUsageDataFactory.from_datastore(args.datastore, name, args.from_date, args.to_date)
+        ax_dict = fig.subplot_mosaic([['usage_graph'], ['temp_graph']])
+        DailyUsageGraph(usage_data=usage_data, usage_axes=ax_dict['usage_graph'], temp_axes=ax_dict['temp_graph'])
+    with span('render'):
+        fig.tight_layout()
+        fig.savefig(args.output)
+    print(f'{args.graph.capitalize()} usage graph written to {args.output}.')
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    # choices are spelled out here rather than imported so building the parser imports nothing heavy
+    parser = argparse.ArgumentParser(prog='home-power-usage', description='Process home power usage exports.')
+    parser.add_argument('--trace', type=Path, help='write stage timings to this .json or .csv file')
+    parser.add_argument('--trace-memory', action='store_true', help='include peak memory in the trace, slower')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    datastore = argparse.ArgumentParser(add_help=False)
+    datastore.add_argument('--datastore', type=Path, required=True, help='HDF5 data store')
+    date_range = argparse.ArgumentParser(add_help=False)
+    date_range.add_argument('--from', dest='from_date', type=iso_date, help='first day, YYYY-MM-DD')
+    date_range.add_argument('--to', dest='to_date', type=iso_date, help='last day, YYYY-MM-DD')
+    billing = argparse.ArgumentParser(add_help=False)
+    billing.add_argument('--billing-day', type=int, default=1, help='day of the month billing cycles start')
+
+    ingest_parser = subparsers.add_parser('ingest', parents=[datastore, date_range, billing],
+                                          help='add usage workbooks to the continuous series')
+    ingest_parser.add_argument('workbooks', type=Path, nargs='+', help='PPL usage workbooks or folders of them')
+    ingest_parser.add_argument('--temps', type=Path, help='temperature spreadsheet, file or folder')
+    ingest_parser.add_argument('--temp-source', choices=TEMP_SOURCES, default=TEMP_SOURCE_NWS,
+                               help='format of --temps')
+    ingest_parser.add_argument('--overlap', choices=['newest', 'oldest'], default='newest',
+                               help='which readings win for days already ingested')
+    ingest_parser.add_argument('--jobs', type=int, help='worker processes reading workbooks, all cores by default')
+    ingest_parser.add_argument('--split-meters', action='store_true', help='keep a series for each meter')
+    ingest_parser.add_argument('--backend', choices=['table', 'matrix'], default='table',
+                               help='keep the hourly series as store tables or memory mapped matrices beside it')
+    ingest_parser.set_defaults(func=ingest)
+
+    temps_parser = subparsers.add_parser('temps', parents=[datastore, date_range],
+                                         help='store temperatures and list the days each source supplies')
+    temps_parser.add_argument('--temps', type=Path, help='temperature spreadsheet, file or folder to store')
+    temps_parser.add_argument('--temp-source', choices=TEMP_SOURCES, default=TEMP_SOURCE_NWS,
+                              help='format of --temps')
+    temps_parser.set_defaults(func=temps)
+
+    merge_parser = subparsers.add_parser('merge', parents=[datastore], help='merge stored data frames')
+    merge_parser.add_argument('kind', choices=[GRAPH_DAILY, GRAPH_HOURLY])
+    merge_parser.add_argument('names', nargs='+', help='data frame names')
+    merge_parser.set_defaults(func=merge)
+
+    list_parser = subparsers.add_parser('list', parents=[datastore], help='list stored data frames')
+    list_parser.add_argument('--kind', choices=[GRAPH_DAILY, GRAPH_HOURLY])
+    list_parser.set_defaults(func=list_frames)
+
+    report_parser = subparsers.add_parser('report', parents=[datastore, date_range, billing],
+                                          help='print usage totals by period')
+    report_parser.add_argument('--period', choices=['Daily', 'Weekly', 'Monthly', 'Billing'], default='Monthly')
+    report_parser.add_argument('--meter', help='meter number, for stores ingested with --split-meters')
+    report_parser.add_argument('--rebuild', action='store_true', help='rebuild the rollups first')
+    report_parser.add_argument('--csv', action='store_true', help='write CSV instead of a table')
+    report_parser.set_defaults(func=report)
+
+    fit_parser = subparsers.add_parser('fit', parents=[datastore, date_range],
+                                       help='fit daily usage against heating and cooling degree days')
+    fit_parser.add_argument('--name', help='daily data frame name, the continuous series by default')
+    fit_parser.add_argument('--window', type=int, help='days in each rolling window, one fit of every day by default')
+    fit_parser.add_argument('--step', type=int, default=30, help='days between rolling windows')
+    fit_parser.add_argument('--csv', action='store_true', help='write CSV instead of a table')
+    fit_parser.set_defaults(func=fit)
+
+    render_parser = subparsers.add_parser('render', parents=[datastore, date_range], help='draw a usage graph')
+    render_parser.add_argument('graph', choices=[GRAPH_DAILY, GRAPH_HOURLY])
+    render_parser.add_argument('output', type=Path, help='image file, the format follows the suffix')
+    render_parser.add_argument('--name', help='data frame name, the continuous series by default')
+    render_parser.add_argument('--show', nargs='+', choices=['average', 'actual', 'min', 'max'],
+                               default=['average'], help='hourly series to draw')
+    render_parser.add_argument('--width', type=float, default=12.0, help='inches')
+    render_parser.add_argument('--height', type=float, default=8.0, help='inches')
+    render_parser.set_defaults(func=render)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.trace is None:
+        return args.func(args)
+    from data_cruncher.tracing import tracer
+
+    # the stages are listed on stderr as they finish, so they don't mix with report output
+    tracer.enable(args.trace_memory)
+    tracer.add_listener(lambda span_record: print(span_record.describe(), file=sys.stderr))
+    try:
+        return args.func(args)
+    finally:
+        tracer.write(args.trace)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
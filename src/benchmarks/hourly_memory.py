@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_usage
+from data_cruncher.usage_data import qtr_hr_times, HourlyUsageDataFactory
+
+
+def legacy_long_format(usage_df: pd.DataFrame) -> pd.DataFrame:
+    # the long format frame as it used to be held: a datetime time of day, float64 usage and string types
+    return pd.DataFrame({'Date': usage_df['Date'],
+                         'time': np.array(qtr_hr_times, dtype='datetime64[ns]')[usage_df['interval'].to_numpy()],
+                         'usage': usage_df['usage'].astype('float64'),
+                         'type': usage_df['type'].astype(object)})
+
+
+def frame_bytes(data_frame: pd.DataFrame) -> int:
+    return int(data_frame.memory_usage(index=True, deep=True).sum())
+
+
+if __name__ == '__main__':
+    print(f'{"years":>6} {"rows":>10} {"before MB/yr":>13} {"after MB/yr":>12} {"bytes/row":>10} {"saved":>6}')
+    for years in (1, 5, 10):
+        usage_df = synthetic_usage(years)
+        hourly_usage_data = HourlyUsageDataFactory.from_frame(usage_df, usage_df['Date'].min(), usage_df['Date'].max())
+        compact_df = hourly_usage_data.data_frame
+        before = frame_bytes(legacy_long_format(compact_df))
+        after = frame_bytes(compact_df)
+        print(f'{years:>6} {len(compact_df):>10} {before / years / 2 ** 20:>13.2f} {after / years / 2 ** 20:>12.2f} '
+              f'{after / len(compact_df):>10.1f} {1 - after / before:>6.0%}')
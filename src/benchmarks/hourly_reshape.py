@@ -0,0 +1,25 @@
+from time import perf_counter
+
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_usage
+from data_cruncher.usage_data import qtr_hr_fields, to_long_format
+
+
+def time_reshape(usage_df: pd.DataFrame, repeat: int = 5) -> float:
+    # best of several runs, in seconds
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        to_long_format(usage_df)
+        best = min(best, perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    print(f'{"years":>6} {"rows":>10} {"seconds":>10} {"ns/reading":>11}')
+    for years in (1, 2, 5, 10, 20):
+        usage_df = synthetic_usage(years)
+        elapsed = time_reshape(usage_df)
+        readings = usage_df.shape[0] * len(qtr_hr_fields)
+        print(f'{years:>6} {usage_df.shape[0]:>10} {elapsed:>10.4f} {elapsed / readings * 1e9:>11.1f}')
@@ -0,0 +1,72 @@
+from importlib.util import find_spec
+import os
+from pathlib import Path
+import subprocess
+import sys
+
+SRC_PATH = Path(__file__).parent.parent
+MAIN_PATH = SRC_PATH.parent.joinpath('main.py')
+
+# modules the light entry points must never load, they cost most of a cold start
+HEAVY_MODULES: list[str] = ['pandas', 'numpy', 'matplotlib', 'openpyxl', 'yaml']
+
+#
+# (description, python arguments, import time budget in seconds, heavy modules allowed).  Budgets are the
+# summed cumulative time of the top level imports reported by -X importtime, less those the interpreter
+# makes before running anything, with headroom over the measured times so only a real regression trips them.
+#
+STARTUP_TARGETS: list[tuple[str, list[str], float, bool]] = [
+    ('cli help', [MAIN_PATH.__str__(), '--help'], 0.05, False),
+    ('catalog', ['-c', 'import data_cruncher.catalog'], 0.05, False),
+    ('gui jobs', ['-c', 'import gui.jobs'], 0.05, False),
+    ('usage data', ['-c', 'import data_cruncher.usage_data'], 1.0, True),
+]
+# the main window needs PySimpleGUIQt, its target is only measured where it is installed
+GUI_TARGET: tuple[str, list[str], float, bool] = ('gui main', ['-c', 'import gui.main'], 1.0, False)
+
+
+def import_times(args: list[str], skip: set[str] | None = None) -> tuple[float, set[str]]:
+    #
+    # run python with -X importtime, returning the time taken by the top level imports not in skip, in seconds,
+    # and every module imported
+    #
+    env = dict(os.environ, PYTHONPATH=SRC_PATH.__str__())
+    completed = subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=SRC_PATH, env=env,
+                               capture_output=True, text=True, check=True)
+    total_us = 0
+    modules: set[str] = set()
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # nested imports are indented below the module importing them
+        if not name[1:].startswith(' ') and (skip is None or name.strip() not in skip):
+            total_us += int(cumulative)
+        modules.add(name.strip())
+    return total_us / 1e6, modules
+
+
+def check_startup(repeat: int = 5) -> list[str]:
+    # best of repeat runs for each target, returns a description of each failure
+    targets = STARTUP_TARGETS + ([GUI_TARGET] if find_spec('PySimpleGUIQt') is not None else [])
+    interpreter_modules = import_times(['-c', 'pass'])[1]
+    failures: list[str] = []
+    print(f'{"target":<12} {"seconds":>8} {"budget":>8}')
+    for description, args, budget, heavy_allowed in targets:
+        runs = [import_times(args, interpreter_modules) for _ in range(repeat)]
+        seconds = min(run[0] for run in runs)
+        print(f'{description:<12} {seconds:>8.3f} {budget:>8.3f}')
+        if seconds > budget:
+            failures.append(f'{description} imports took {seconds:.3f}s, over the {budget:.3f}s budget.')
+        if not heavy_allowed:
+            heavy = sorted(module for module in HEAVY_MODULES if module in runs[0][1])
+            if len(heavy) > 0:
+                failures.append(f'{description} imported {", ".join(heavy)}.')
+    return failures
+
+
+if __name__ == '__main__':
+    startup_failures = check_startup()
+    for failure in startup_failures:
+        print(failure)
+    sys.exit(1 if len(startup_failures) > 0 else 0)
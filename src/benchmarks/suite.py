@@ -0,0 +1,158 @@
+import argparse
+from datetime import datetime
+import json
+from pathlib import Path
+import platform
+import subprocess
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from benchmarks.synthetic import write_synthetic
+from data_cruncher.temperature_data import TemperatureDataFactory
+from data_cruncher.usage_data import DailyUsageDataFactory, HourlyUsageDataFactory
+from data_cruncher.workbook_cache import workbook_cache
+from visualization.daily_usage_graph import DailyUsageGraph
+from visualization.data_type import DataType
+from visualization.hourly_usage_graph import HourlyUsageGraph
+
+DEFAULT_YEARS: list[float] = [1, 2, 5]
+DEFAULT_WORK_FOLDER = Path('benchmark-data')
+# the timings are kept with the generated workbooks unless another file is named
+RESULTS_NAME = 'results.jsonl'
+# slower than the previous run by more than this fraction is reported as a regression
+REGRESSION_THRESHOLD = 0.2
+
+
+def best_time(step: Callable[[], object], repeat: int) -> float:
+    # best of repeat runs, in seconds
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        step()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def draw_hourly(hourly_usage_data):
+    fig, ax = plt.subplots(figsize=(12, 8))
+    HourlyUsageGraph(usage_data=hourly_usage_data, axes=ax, show=(DataType.AVERAGE, DataType.ACTUAL))
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def draw_daily(daily_usage_data):
+    fig, ax_dict = plt.subplot_mosaic([['usage_graph'], ['temp_graph']], figsize=(12, 8))
+    DailyUsageGraph(usage_data=daily_usage_data, usage_axes=ax_dict['usage_graph'], temp_axes=ax_dict['temp_graph'])
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def run_size(work_folder: Path, years: float, meters: int, missing_rate: float, repeat: int) -> dict[str, float]:
+    #
+    # time each step of the spreadsheet to data store to graph path for one data size.  Spreadsheet reads are
+    # timed with the workbook cache cleared, the other steps reuse the frames the earlier steps built.
+    #
+    usage_path, temp_path = write_synthetic(work_folder, years, meters, missing_rate)
+    usage_df = pd.read_excel(usage_path)
+    from_date = usage_df['Date'].min().to_pydatetime()
+    to_date = usage_df['Date'].max().to_pydatetime()
+    temp_data = TemperatureDataFactory.from_nws_spreadsheet(temp_path, from_date, to_date)
+    daily_usage_df = usage_df[['Date', 'Total']]
+
+    def hourly_from_spreadsheet():
+        workbook_cache.clear()
+        return HourlyUsageDataFactory.from_spreadsheet(usage_path, from_date, to_date)
+
+    def daily_from_spreadsheet():
+        workbook_cache.clear()
+        return DailyUsageDataFactory.from_spreadsheet(usage_path, temp_data, from_date, to_date)
+
+    timings: dict[str, float] = {
+        'hourly from_spreadsheet': best_time(hourly_from_spreadsheet, repeat),
+        'daily from_spreadsheet': best_time(daily_from_spreadsheet, repeat),
+        'temperature merge': best_time(lambda: DailyUsageDataFactory.from_frame(daily_usage_df, temp_data,
+                                                                                from_date, to_date), repeat),
+    }
+    hourly_usage_data = hourly_from_spreadsheet()
+    daily_usage_data = daily_from_spreadsheet()
+    with TemporaryDirectory() as temp_folder:
+        datastore_path = Path(temp_folder, 'benchmark.h5')
+        timings['hourly save'] = best_time(lambda: hourly_usage_data.save(datastore_path), repeat)
+        timings['daily save'] = best_time(lambda: daily_usage_data.save(datastore_path), repeat)
+        timings['hourly from_datastore'] = best_time(
+            lambda: HourlyUsageDataFactory.from_datastore(datastore_path, hourly_usage_data.name), repeat)
+        timings['daily from_datastore'] = best_time(
+            lambda: DailyUsageDataFactory.from_datastore(datastore_path, daily_usage_data.name), repeat)
+    timings['hourly graph'] = best_time(lambda: draw_hourly(hourly_usage_data), repeat)
+    timings['daily graph'] = best_time(lambda: draw_daily(daily_usage_data), repeat)
+    return timings
+
+
+def git_revision() -> str | None:
+    try:
+        completed = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=Path(__file__).parent,
+                                   capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return completed.stdout.strip()
+
+
+def previous_results(results_path: Path) -> dict[tuple[str, float, int, float], float]:
+    # the latest recorded seconds of each (step, years, meters, missing rate)
+    previous: dict[tuple[str, float, int, float], float] = {}
+    if results_path.exists():
+        with results_path.open(mode='r') as f:
+            for line in f:
+                record = json.loads(line)
+                previous[(record['step'], record['years'], record['meters'], record['missing_rate'])] = \
+                    record['seconds']
+    return previous
+
+
+def run_suite(years_list: list[float], meters: int = 1, missing_rate: float = 0.01, repeat: int = 3,
+              work_folder: Path = DEFAULT_WORK_FOLDER, results_path: Path | None = None) -> list[str]:
+    #
+    # time every step at every size, append the timings to the results file as JSON lines and compare them
+    # with the previous run's.  Returns a description of each regression.
+    #
+    work_folder.mkdir(parents=True, exist_ok=True)
+    results_path = work_folder / RESULTS_NAME if results_path is None else results_path
+    previous = previous_results(results_path)
+    run_info = {'run_at': datetime.now().isoformat(timespec='seconds'), 'revision': git_revision(),
+                'python': platform.python_version(), 'pandas': pd.__version__}
+    regressions: list[str] = []
+    print(f'{"step":<24} {"years":>6} {"seconds":>9} {"previous":>9} {"change":>8}')
+    with results_path.open(mode='a') as f:
+        for years in years_list:
+            for step, seconds in run_size(work_folder, years, meters, missing_rate, repeat).items():
+                record = dict(run_info, step=step, years=years, meters=meters, missing_rate=missing_rate,
+                              seconds=seconds)
+                f.write(json.dumps(record) + '\n')
+                before = previous.get((step, years, meters, missing_rate))
+                change = '' if before is None else f'{(seconds - before) / before:+.0%}'
+                print(f'{step:<24} {years:>6} {seconds:>9.4f} {"" if before is None else f"{before:.4f}":>9} '
+                      f'{change:>8}')
+                if before is not None and seconds > before * (1 + REGRESSION_THRESHOLD):
+                    regressions.append(f'{step} at {years} years took {seconds:.4f}s, {before:.4f}s before.')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the usage data pipeline on synthetic PPL workbooks.')
+    parser.add_argument('--years', type=float, nargs='+', default=DEFAULT_YEARS)
+    parser.add_argument('--meters', type=int, default=1)
+    parser.add_argument('--missing-rate', type=float, default=0.01)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--work-folder', type=Path, default=DEFAULT_WORK_FOLDER, help='generated workbooks')
+    parser.add_argument('--results', type=Path,
+                        help=f'JSON lines timings, {RESULTS_NAME} in the work folder by default')
+    args = parser.parse_args()
+    for regression in run_suite(args.years, args.meters, args.missing_rate, args.repeat, args.work_folder,
+                                args.results):
+        print(regression)
@@ -0,0 +1,77 @@
+from datetime import datetime
+from pathlib import Path
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from data_cruncher.usage_data import qtr_hr_fields
+
+# the last day of the sample workbook, so generated data is the same whenever it is generated
+DEFAULT_END_DATE = datetime(year=2024, month=1, day=12)
+ACCOUNT_NUMBER = 4278050047
+FIRST_METER_NUMBER = 301213205
+
+
+def synthetic_usage(years: float, meters: int = 1, missing_rate: float = 0.01, seed: int = 0,
+                    end_date: datetime = DEFAULT_END_DATE) -> pd.DataFrame:
+    #
+    # a PPL shaped usage export: a row per meter and day with the account and meter numbers, the day's minimum,
+    # maximum and total and the 96 interval readings.  Readings follow a seasonal and time of day pattern with
+    # gamma distributed noise, missing_rate of them are left blank.
+    #
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=end_date, periods=int(years * 365), freq='D').normalize()
+    day_of_year: np.ndarray = dates.dayofyear.to_numpy()
+    # heating in winter, cooling in summer and a morning and evening peak each day
+    season: np.ndarray = 1.0 + 0.5 * np.cos(4 * np.pi * (day_of_year - 15) / 365.25)
+    hours: np.ndarray = np.arange(len(qtr_hr_fields)) / 4
+    time_of_day: np.ndarray = (0.6 + 0.5 * np.exp(-((hours - 7.5) / 1.5) ** 2) +
+                               0.9 * np.exp(-((hours - 18.5) / 2.5) ** 2))
+    frames: list[pd.DataFrame] = []
+    for meter in range(meters):
+        values: np.ndarray = np.outer(season, time_of_day) * rng.gamma(shape=4.0, scale=0.25,
+                                                                      size=(len(dates), len(qtr_hr_fields)))
+        values = np.round(values, 2)
+        values[rng.random(values.shape) < missing_rate] = np.nan
+        with warnings.catch_warnings():
+            # days with every reading missing have no minimum or maximum
+            warnings.simplefilter('ignore', RuntimeWarning)
+            usage_df = pd.DataFrame({'Account Number': ACCOUNT_NUMBER,
+                                     'Meter Number': FIRST_METER_NUMBER + meter,
+                                     'Date': dates,
+                                     'Min': np.nanmin(values, axis=1),
+                                     'Max': np.nanmax(values, axis=1),
+                                     'Total': np.round(np.nansum(values, axis=1), 2)})
+        frames.append(pd.concat([usage_df, pd.DataFrame(values, columns=qtr_hr_fields)], axis=1))
+    return pd.concat(frames, ignore_index=True)
+
+
+def synthetic_temperatures(from_date: datetime, to_date: datetime, seed: int = 0) -> pd.DataFrame:
+    # NWS spreadsheet shaped daily temperatures (Date, Max, Min, Average) for the days between the dates
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start=from_date, end=to_date, freq='D')
+    mean: np.ndarray = 60 - 20 * np.cos(2 * np.pi * (dates.dayofyear.to_numpy() - 15) / 365.25) + \
+        rng.normal(0, 5, len(dates))
+    spread: np.ndarray = rng.uniform(8, 25, len(dates))
+    max_temps: np.ndarray = np.round(mean + spread / 2).astype('int64')
+    min_temps: np.ndarray = np.round(mean - spread / 2).astype('int64')
+    return pd.DataFrame({'Date': dates.strftime('%Y-%m-%d'), 'Max': max_temps, 'Min': min_temps,
+                         'Average': (max_temps + min_temps) / 2})
+
+
+def write_synthetic(folder: Path, years: float, meters: int = 1, missing_rate: float = 0.01,
+                    seed: int = 0) -> tuple[Path, Path]:
+    #
+    # write a usage workbook and a matching temperature spreadsheet, named after the parameters so they are
+    # generated once and reused.  Returns the usage and temperature paths.
+    #
+    folder.mkdir(parents=True, exist_ok=True)
+    stem = f'usage-{years}y-{meters}m-{missing_rate}-{seed}'
+    usage_path = folder.joinpath(f'{stem}.xlsx')
+    temp_path = folder.joinpath(f'{stem}-temps.xlsx')
+    if not usage_path.exists() or not temp_path.exists():
+        usage_df = synthetic_usage(years, meters, missing_rate, seed)
+        usage_df.to_excel(usage_path, index=False)
+        synthetic_temperatures(usage_df['Date'].min(), usage_df['Date'].max(), seed).to_excel(temp_path, index=False)
+    return usage_path, temp_path
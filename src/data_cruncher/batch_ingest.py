@@ -0,0 +1,110 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from data_cruncher.rollups import UsageRollups
+from data_cruncher.temperature_data import TemperatureData
+from data_cruncher.tracing import span
+from data_cruncher.usage_data import (BACKEND_TABLE, DAILY_SERIES, HOURLY_SERIES, OVERLAP_NEWEST, DailyUsageData,
+                                      DailyUsageDataFactory, HourlyUsageData, HourlyUsageDataFactory, check_backend,
+                                      check_series, meter_series, qtr_hr_fields)
+
+METER_COL = 'Meter Number'
+EXPORT_PATTERN = '*.xlsx'
+
+
+def export_paths(paths: list[Path]) -> list[Path]:
+    # workbooks named directly keep their order, those found in a folder are taken oldest first
+    found: list[Path] = []
+    for path in paths:
+        if path.is_dir():
+            found.extend(sorted(path.glob(EXPORT_PATTERN), key=lambda export_path: export_path.stat().st_mtime))
+        else:
+            found.append(path)
+    return found
+
+
+def read_meters(hourly_usage_path: Path) -> list[tuple[str, pd.DataFrame]]:
+    # runs in a worker process: parse one workbook and split its rows by meter, keeping the columns ingested
+    with span('read workbook') as stage:
+        usage_df = pd.read_excel(hourly_usage_path, dtype={METER_COL: str})
+        stage.rows = len(usage_df)
+    return [(meter.strip(), meter_df[['Date', 'Total'] + qtr_hr_fields])
+            for meter, meter_df in usage_df.groupby(METER_COL, sort=True) if meter_df['Date'].notna().any()]
+
+
+def reshape_meter(meter: str, meter_df: pd.DataFrame, daily_temp_data: TemperatureData, from_date: datetime | None,
+                  to_date: datetime | None, source: str) -> tuple[str, HourlyUsageData, DailyUsageData]:
+    #
+    # runs in a worker process: reshape one meter's rows with the usage factories.  Without a date range the
+    # meter covers the days its rows hold.
+    #
+    dates = meter_df['Date'].dropna()
+    meter_from = dates.min().to_pydatetime() if from_date is None else from_date
+    meter_to = dates.max().to_pydatetime() if to_date is None else to_date
+    hourly_usage_data = HourlyUsageDataFactory.from_frame(meter_df[['Date'] + qtr_hr_fields], meter_from, meter_to,
+                                                          source=source)
+    daily_usage_data = DailyUsageDataFactory.from_frame(meter_df[['Date', 'Total']], daily_temp_data, meter_from,
+                                                        meter_to, source=source)
+    return meter, hourly_usage_data, daily_usage_data
+
+
+def batch_ingest(datastore_path: Path, hourly_usage_paths: list[Path], daily_temp_data: TemperatureData,
+                 from_date: datetime | None = None, to_date: datetime | None = None, overlap: str = OVERLAP_NEWEST,
+                 jobs: int | None = None, split_meters: bool = False,
+                 rollups: UsageRollups | None = None, backend: str = BACKEND_TABLE) -> dict[str, int]:
+    #
+    # parse the workbooks in a process pool, one task per workbook, and reshape their meters in the same pool,
+    # one task per meter of each workbook, so a single export covering several meters is spread over the
+    # workers too.  Each meter's days are then merged in workbook order, later workbooks winning where they
+    # overlap, and each series is appended once.  Meters share the continuous series unless split_meters
+    # gives each its own, then each meter's series keeps its own rollups.  The hourly series are kept by the
+    # backend, tables in the store or usage matrices beside it, the daily series are always tables.  With
+    # jobs=1 everything runs in this process.  Returns the rows appended to each series.
+    #
+    # The series and the rollups are separate writes, the store has no transactions.  Every series is
+    # checked against its stored table before any is written, so an ingest that doesn't fit writes nothing,
+    # but an I/O error part way through leaves the series written before it.
+    #
+    with span('read exports', rows=len(hourly_usage_paths)), ProcessPoolExecutor(max_workers=jobs) as executor:
+        # the workers' own stages are not traced, only the time waiting on them.  A single workbook is read
+        # here rather than copied back from a worker.
+        if jobs == 1 or len(hourly_usage_paths) < 2:
+            workbooks = [read_meters(path) for path in hourly_usage_paths]
+        else:
+            workbooks = list(executor.map(read_meters, hourly_usage_paths))
+        tasks: list[tuple[str, pd.DataFrame, str]] = [(meter, meter_df, path.name)
+                                                      for path, meters in zip(hourly_usage_paths, workbooks)
+                                                      for meter, meter_df in meters]
+        if jobs == 1 or len(tasks) < 2:
+            results = [reshape_meter(meter, meter_df, daily_temp_data, from_date, to_date, source)
+                       for meter, meter_df, source in tasks]
+        else:
+            results = list(executor.map(reshape_meter, [task[0] for task in tasks], [task[1] for task in tasks],
+                                        [daily_temp_data] * len(tasks), [from_date] * len(tasks),
+                                        [to_date] * len(tasks), [task[2] for task in tasks]))
+    by_meter: dict[str, list[tuple[HourlyUsageData, DailyUsageData]]] = {}
+    for meter, hourly_usage_data, daily_usage_data in results:
+        by_meter.setdefault(meter, []).append((hourly_usage_data, daily_usage_data))
+    if len(by_meter) > 1 and not split_meters:
+        raise ValueError(f'The exports cover {len(by_meter)} meters, ingest them with split_meters.')
+    series: list[tuple[str, HourlyUsageData, str, DailyUsageData]] = []
+    for meter, frames in sorted(by_meter.items()):
+        series.append((meter_series(HOURLY_SERIES, meter) if split_meters else HOURLY_SERIES,
+                       frames[0][0].merge(*[frame[0] for frame in frames[1:]]),
+                       meter_series(DAILY_SERIES, meter) if split_meters else DAILY_SERIES,
+                       frames[0][1].merge(*[frame[1] for frame in frames[1:]])))
+    # every series is checked against its stored table before the first is written to
+    for hourly_key, hourly_usage_data, daily_key, daily_usage_data in series:
+        check_backend(datastore_path, hourly_key, backend)
+        check_series(datastore_path, hourly_key, hourly_usage_data.series_frame())
+        check_series(datastore_path, daily_key, daily_usage_data.series_frame())
+    appended: dict[str, int] = {}
+    for hourly_key, hourly_usage_data, daily_key, daily_usage_data in series:
+        series_rollups = None if rollups is None else rollups.for_series(hourly_key)
+        appended[hourly_key] = hourly_usage_data.ingest(datastore_path, overlap, series_rollups, key=hourly_key,
+                                                        backend=backend)
+        appended[daily_key] = daily_usage_data.ingest(datastore_path, overlap, key=daily_key)
+    return appended
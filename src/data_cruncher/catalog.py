@@ -0,0 +1,206 @@
+from bisect import bisect_right
+from datetime import datetime
+from hashlib import sha1
+import json
+from pathlib import Path
+import re
+from typing import TYPE_CHECKING
+
+# pandas is only imported when a frame is recorded or the store is read, listing a catalog doesn't need it
+if TYPE_CHECKING:
+    import pandas as pd
+
+CATALOG_SUFFIX = '.catalog.json'
+KIND_DAILY = 'daily'
+KIND_HOURLY = 'hourly'
+DATE_FORMAT = '%Y-%m-%d'
+# data store entry names, with the from and to dates as groups
+HOURLY_NAME_REGEX = r'Hourly-(\d{2}/\d{2}/\d{4})-(\d{2}/\d{2}/\d{4})'
+DAILY_NAME_REGEX = r'Daily-(\d{2}/\d{2}/\d{4})-(\d{2}/\d{2}/\d{4})'
+
+
+def frame_checksum(data_frame: 'pd.DataFrame') -> str:
+    import pandas as pd
+
+    return sha1(pd.util.hash_pandas_object(data_frame, index=False).to_numpy().tobytes()).hexdigest()
+
+
+def name_dates(regex: str, name: str) -> tuple[datetime, datetime]:
+    # extract from and to dates from data store entry name
+    match = re.search(regex, name)
+    if match is None:
+        raise ValueError(f'{name} is not a valid data frame name.')
+    return datetime.strptime(match.groups()[0], '%m/%d/%Y'), datetime.strptime(match.groups()[1], '%m/%d/%Y')
+
+
+def stored_dates(ds: 'pd.HDFStore', key: str) -> 'pd.Series | None':
+    #
+    # the Date column of a stored frame, None for hourly frames saved before readings carried their date,
+    # which only have a time of day.  Tables are read a column at a time, frames saved in fixed format before
+    # the store used tables can only be read whole.
+    #
+    storer = ds.get_storer(key)
+    if storer.is_table:
+        return ds.select_column(key, 'Date') if 'Date' in storer.data_columns else None
+    data_frame = ds[key]
+    return data_frame['Date'] if 'Date' in data_frame.columns else None
+
+
+class CatalogEntry:
+    def __init__(self, key: str, kind: str, from_date: datetime, to_date: datetime, rows: int, checksum: str,
+                 source: str | None):
+        self.key: str = key
+        self.kind: str = kind
+        self.from_date: datetime = from_date
+        self.to_date: datetime = to_date
+        self.rows: int = rows
+        self.checksum: str = checksum
+        self.source: str | None = source
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(key=data['key'], kind=data['kind'],
+                   from_date=datetime.strptime(data['from_date'], DATE_FORMAT),
+                   to_date=datetime.strptime(data['to_date'], DATE_FORMAT),
+                   rows=data['rows'], checksum=data['checksum'], source=data.get('source'))
+
+    def to_dict(self) -> dict:
+        return {'key': self.key, 'kind': self.kind,
+                'from_date': self.from_date.strftime(DATE_FORMAT), 'to_date': self.to_date.strftime(DATE_FORMAT),
+                'rows': self.rows, 'checksum': self.checksum, 'source': self.source}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(data={self.to_dict()})'
+
+
+class DataStoreCatalog:
+    #
+    # JSON sidecar next to a data store describing each of its data frames, so listing a store and finding the
+    # frames that cover a date never has to open the HDF5 file
+    #
+    def __init__(self, datastore_path: Path):
+        self.datastore_path: Path = datastore_path
+        self.path: Path = datastore_path.with_name(datastore_path.name + CATALOG_SUFFIX)
+        self.entries: dict[str, CatalogEntry] = {}
+        self._starts: list[datetime] | None = None
+        self._by_start: list[CatalogEntry] = []
+        self._reach: list[datetime] = []
+        if self.path.exists():
+            with self.path.open(mode='r') as f:
+                for data in json.load(f):
+                    entry = CatalogEntry.from_dict(data)
+                    self.entries[entry.key] = entry
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def get(self, key: str) -> CatalogEntry | None:
+        return self.entries.get(key.lstrip('/'))
+
+    def keys(self, kind: str | None = None, pattern: str | None = None) -> list[str]:
+        return sorted(key for key, entry in self.entries.items()
+                      if (kind is None or entry.kind == kind) and (pattern is None or re.fullmatch(pattern, key)))
+
+    def record(self, key: str, kind: str, data_frame: 'pd.DataFrame', source: str | None = None,
+               from_date: datetime | None = None, to_date: datetime | None = None,
+               append: bool = False, removed: int = 0) -> CatalogEntry:
+        #
+        # describe a frame written to the store under key, by default covering the dates it holds.  With
+        # append the frame holds rows added to an existing table after removing removed rows: the date range
+        # and row count are adjusted and the checksum is chained onto the previous one rather than
+        # recomputed over the whole table.
+        #
+        key = key.lstrip('/')
+        dates = data_frame['Date'].dropna()
+        from_date = dates.min().to_pydatetime() if from_date is None else from_date
+        to_date = dates.max().to_pydatetime() if to_date is None else to_date
+        rows = len(data_frame)
+        checksum = frame_checksum(data_frame)
+        previous = self.entries.get(key)
+        if append and previous is not None:
+            from_date = min(from_date, previous.from_date)
+            to_date = max(to_date, previous.to_date)
+            rows += previous.rows - removed
+            checksum = sha1(f'{previous.checksum}{checksum}'.encode()).hexdigest()
+            source = source if source is not None else previous.source
+        entry = CatalogEntry(key=key, kind=kind, from_date=from_date, to_date=to_date, rows=rows,
+                             checksum=checksum, source=source)
+        self.entries[key] = entry
+        self.save()
+        return entry
+
+    def remove(self, key: str):
+        if self.entries.pop(key.lstrip('/'), None) is not None:
+            self.save()
+
+    def covering(self, date: datetime, kind: str | None = None) -> list[CatalogEntry]:
+        #
+        # entries whose date range includes date.  Entries are kept ordered by from date along with the running
+        # maximum of their to dates, so the search starts at the last entry beginning on or before date and
+        # stops as soon as no earlier entry can reach it.
+        #
+        if self._starts is None:
+            self._by_start = sorted(self.entries.values(), key=lambda entry: entry.from_date)
+            self._starts = [entry.from_date for entry in self._by_start]
+            self._reach = []
+            for entry in self._by_start:
+                self._reach.append(entry.to_date if len(self._reach) == 0 else max(self._reach[-1], entry.to_date))
+        found: list[CatalogEntry] = []
+        pos = bisect_right(self._starts, date) - 1
+        while pos >= 0 and self._reach[pos] >= date:
+            entry = self._by_start[pos]
+            if entry.to_date >= date and (kind is None or entry.kind == kind):
+                found.append(entry)
+            pos -= 1
+        found.reverse()
+        return found
+
+    def rebuild(self, source: str | None = None):
+        #
+        # recreate the catalog of a data store written before catalogs existed.  Tables are described from their
+        # Date column and row count without reading the rest of the table, so their checksum covers the dates
+        # alone.  Fixed format frames can only be read whole and are checksummed whole.  Frames without dates
+        # take their range from their name, those that have neither are left out.
+        #
+        import pandas as pd
+
+        self.entries = {}
+        with pd.HDFStore(self.datastore_path.__str__(), mode='r') as ds:
+            for key in ds.keys():
+                # skip the metadata nodes pandas keeps for categorical columns
+                if '/meta/' in key:
+                    continue
+                name = key.lstrip('/')
+                kind = KIND_HOURLY if name.startswith('Hourly') else KIND_DAILY if name.startswith('Daily') else None
+                if kind is None:
+                    continue
+                storer = ds.get_storer(key)
+                if storer.is_table:
+                    dates = ds.select_column(key, 'Date') if 'Date' in storer.data_columns else None
+                    rows = storer.nrows
+                    checksum = sha1(f'{rows}{"" if dates is None else frame_checksum(dates.to_frame())}'
+                                    .encode()).hexdigest()
+                else:
+                    data_frame = ds[key]
+                    dates = data_frame['Date'] if 'Date' in data_frame.columns else None
+                    rows = len(data_frame)
+                    checksum = frame_checksum(data_frame)
+                dates = None if dates is None else dates.dropna()
+                if dates is not None and len(dates) > 0:
+                    from_date, to_date = dates.min().to_pydatetime(), dates.max().to_pydatetime()
+                else:
+                    try:
+                        from_date, to_date = name_dates(HOURLY_NAME_REGEX if kind == KIND_HOURLY
+                                                        else DAILY_NAME_REGEX, name)
+                    except ValueError:
+                        continue
+                self.entries[name] = CatalogEntry(key=name, kind=kind, from_date=from_date, to_date=to_date,
+                                                  rows=rows, checksum=checksum, source=source)
+        self.save()
+
+    def save(self):
+        self._starts = None
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+        with temp_path.open(mode='w') as f:
+            json.dump([entry.to_dict() for entry in self.entries.values()], f, indent=2)
+        temp_path.replace(self.path)
@@ -0,0 +1,212 @@
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+
+from data_cruncher.catalog import DataStoreCatalog
+from data_cruncher.temperature_data import AVE_TEMP_COL, MAX_TEMP_COL, MIN_TEMP_COL
+from data_cruncher.tracing import span
+from data_cruncher.usage_data import DAILY_SERIES, date_range_where
+
+# candidate balance points in degrees Fahrenheit, every pair with heating base <= cooling base is fitted
+DEFAULT_HEATING_BASES: np.ndarray = np.arange(45.0, 71.0)
+DEFAULT_COOLING_BASES: np.ndarray = np.arange(55.0, 81.0)
+USAGE_COL = 'Total'
+# NWS spreadsheets name the average temperature column Average, the other sources Avg
+AVERAGE_COLS: list[str] = [AVE_TEMP_COL, 'Average']
+FIT_COLUMNS: list[str] = ['heating_base', 'cooling_base', 'base_load', 'heating_slope', 'cooling_slope',
+                          'r_squared', 'days']
+# fewer days than this in a window leave it without a fit
+MIN_FIT_DAYS = 14
+DEFAULT_MAX_FITS = 64
+
+
+def mean_temperature(daily_df: pd.DataFrame) -> np.ndarray:
+    # each day's average temperature, the midpoint of its minimum and maximum where no average was recorded
+    mean = np.full(len(daily_df), np.nan)
+    for column in AVERAGE_COLS:
+        if column in daily_df.columns:
+            mean = np.where(np.isnan(mean), daily_df[column].to_numpy(dtype='float64'), mean)
+    if MIN_TEMP_COL in daily_df.columns and MAX_TEMP_COL in daily_df.columns:
+        midpoint = (daily_df[MIN_TEMP_COL].to_numpy(dtype='float64') +
+                    daily_df[MAX_TEMP_COL].to_numpy(dtype='float64')) / 2
+        mean = np.where(np.isnan(mean), midpoint, mean)
+    return mean
+
+
+def heating_degree_days(temps: np.ndarray, bases: np.ndarray) -> np.ndarray:
+    # (bases, days), how far each day's mean fell below each base
+    return np.maximum(bases[:, None] - temps[None, :], 0.0)
+
+
+def cooling_degree_days(temps: np.ndarray, bases: np.ndarray) -> np.ndarray:
+    # (bases, days), how far each day's mean rose above each base
+    return np.maximum(temps[None, :] - bases[:, None], 0.0)
+
+
+def prefix_sums(values: np.ndarray) -> np.ndarray:
+    # running totals along the last axis with a leading zero, so a window's sum is two lookups
+    sums = np.zeros(values.shape[:-1] + (values.shape[-1] + 1,))
+    np.cumsum(values, axis=-1, out=sums[..., 1:])
+    return sums
+
+
+def fit_windows(temps: np.ndarray, usage: np.ndarray, starts: np.ndarray, stops: np.ndarray,
+                heating_bases: np.ndarray = DEFAULT_HEATING_BASES,
+                cooling_bases: np.ndarray = DEFAULT_COOLING_BASES) -> np.ndarray:
+    #
+    # fit usage = base load + heating slope x HDD + cooling slope x CDD over the days starts[i]:stops[i] of
+    # each window, for every (heating base, cooling base) candidate, and keep each window's best fit.  The
+    # sums behind the normal equations of every window and candidate come from prefix sums over the days, so
+    # all of the fits are solved as one batch of 3 x 3 systems.  Fits with a negative slope are rejected.
+    # Returns (windows, FIT_COLUMNS), NaN for windows with fewer than MIN_FIT_DAYS usable days.
+    #
+    present: np.ndarray = ~np.isnan(temps) & ~np.isnan(usage)
+    temps = np.where(present, temps, 0.0)
+    weight: np.ndarray = present.astype('float64')
+    y: np.ndarray = np.where(present, usage, 0.0)
+    hdd: np.ndarray = heating_degree_days(temps, heating_bases) * weight
+    cdd: np.ndarray = cooling_degree_days(temps, cooling_bases) * weight
+
+    def window_sums(values: np.ndarray) -> np.ndarray:
+        sums = prefix_sums(values)
+        return np.moveaxis(sums[..., stops] - sums[..., starts], -1, 0)
+
+    days = window_sums(weight)
+    sum_y, sum_yy = window_sums(y), window_sums(y * y)
+    sum_h, sum_hh, sum_hy = window_sums(hdd), window_sums(hdd * hdd), window_sums(hdd * y)
+    sum_c, sum_cc, sum_cy = window_sums(cdd), window_sums(cdd * cdd), window_sums(cdd * y)
+    # (windows, heating bases, cooling bases), the only sum depending on both bases
+    sum_hc = window_sums(hdd[:, None, :] * cdd[None, :, :])
+
+    shape = sum_hc.shape
+    xtx = np.empty(shape + (3, 3))
+    xtx[..., 0, 0] = days[:, None, None]
+    xtx[..., 0, 1] = xtx[..., 1, 0] = sum_h[:, :, None]
+    xtx[..., 0, 2] = xtx[..., 2, 0] = sum_c[:, None, :]
+    xtx[..., 1, 1] = sum_hh[:, :, None]
+    xtx[..., 2, 2] = sum_cc[:, None, :]
+    xtx[..., 1, 2] = xtx[..., 2, 1] = sum_hc
+    xty = np.empty(shape + (3,))
+    xty[..., 0] = sum_y[:, None, None]
+    xty[..., 1] = sum_hy[:, :, None]
+    xty[..., 2] = sum_cy[:, None, :]
+    # the pseudo inverse leaves a slope at zero where a window has no heating or cooling days for a base
+    coefficients = np.einsum('...ij,...j->...i', np.linalg.pinv(xtx), xty)
+    sse = sum_yy[:, None, None] - 2 * np.einsum('...i,...i->...', coefficients, xty) + \
+        np.einsum('...i,...ij,...j->...', coefficients, xtx, coefficients)
+    valid = (heating_bases[:, None] <= cooling_bases[None, :])[None, :, :] & \
+        (coefficients[..., 1] >= 0) & (coefficients[..., 2] >= 0)
+    sse = np.where(valid, sse, np.inf)
+
+    fits = np.full((len(starts), len(FIT_COLUMNS)), np.nan)
+    best = np.argmin(sse.reshape(len(starts), -1), axis=1)
+    heating, cooling = np.unravel_index(best, shape[1:])
+    windows = np.arange(len(starts))
+    total_ss = sum_yy - sum_y ** 2 / np.maximum(days, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fits[:, 0] = heating_bases[heating]
+        fits[:, 1] = cooling_bases[cooling]
+        fits[:, 2:5] = coefficients[windows, heating, cooling]
+        fits[:, 5] = 1 - sse[windows, heating, cooling] / total_ss
+    fits[:, 6] = days
+    fits[(days < MIN_FIT_DAYS) | ~np.isfinite(sse[windows, heating, cooling]), :6] = np.nan
+    return fits
+
+
+def daily_arrays(daily_df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # days in date order with their mean temperatures and usage
+    if not any(column in daily_df.columns for column in AVERAGE_COLS + [MIN_TEMP_COL]):
+        raise ValueError('The daily usage has no temperature columns, ingest it with temperatures.')
+    daily_df = daily_df.sort_values('Date', kind='stable')
+    return (daily_df['Date'].to_numpy(dtype='datetime64[D]'), mean_temperature(daily_df),
+            daily_df[USAGE_COL].to_numpy(dtype='float64'))
+
+
+def fit_degree_days(daily_df: pd.DataFrame, heating_bases: np.ndarray = DEFAULT_HEATING_BASES,
+                    cooling_bases: np.ndarray = DEFAULT_COOLING_BASES) -> pd.Series:
+    # the best fit over every day of a daily usage frame
+    dates, temps, usage = daily_arrays(daily_df)
+    fits = fit_windows(temps, usage, np.array([0]), np.array([len(dates)]), heating_bases, cooling_bases)
+    return pd.Series(fits[0], index=FIT_COLUMNS)
+
+
+def rolling_fits(daily_df: pd.DataFrame, window_days: int | None = 365, step_days: int = 30,
+                 heating_bases: np.ndarray = DEFAULT_HEATING_BASES,
+                 cooling_bases: np.ndarray = DEFAULT_COOLING_BASES) -> pd.DataFrame:
+    #
+    # the best fit of each window_days calendar days, the windows ending every step_days days back from the
+    # last day, or of all the days when window_days is None.  One row per window with its first and last day.
+    #
+    dates, temps, usage = daily_arrays(daily_df)
+    if len(dates) == 0:
+        return pd.DataFrame(columns=['from_date', 'to_date'] + FIT_COLUMNS)
+    firsts: np.ndarray = dates[:1]
+    ends: np.ndarray = dates[-1:]
+    if window_days is not None:
+        ends = dates[-1] - np.arange(0, int((dates[-1] - dates[0]).astype('int64')) + 1, step_days)[::-1]
+        firsts = ends - (window_days - 1)
+        # less than one window of days is fitted as a single window
+        if (firsts >= dates[0]).any():
+            firsts, ends = firsts[firsts >= dates[0]], ends[firsts >= dates[0]]
+        else:
+            firsts, ends = dates[:1], dates[-1:]
+    starts = np.searchsorted(dates, firsts, side='left')
+    stops = np.searchsorted(dates, ends, side='right')
+    fits_df = pd.DataFrame(fit_windows(temps, usage, starts, stops, heating_bases, cooling_bases),
+                           columns=FIT_COLUMNS)
+    fits_df.insert(0, 'from_date', firsts.astype('datetime64[ns]'))
+    fits_df.insert(1, 'to_date', ends.astype('datetime64[ns]'))
+    return fits_df
+
+
+class DegreeDayCache:
+    #
+    # fits of stored daily usage, keyed by the data store, its key, the catalog checksum of the frame and the
+    # fit parameters.  Ingesting or saving the frame changes its checksum, so a stale fit is never returned.
+    #
+    def __init__(self, max_fits: int = DEFAULT_MAX_FITS):
+        self.max_fits: int = max_fits
+        self._fits: OrderedDict[tuple, pd.DataFrame] = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def version(datastore_path: Path, key: str) -> str:
+        entry = DataStoreCatalog(datastore_path).get(key)
+        if entry is not None:
+            return entry.checksum
+        # stores without a catalog entry fall back to the file's size and modification time
+        stat = datastore_path.stat()
+        return f'{stat.st_size}-{stat.st_mtime_ns}'
+
+    def rolling_fits(self, datastore_path: Path, key: str = DAILY_SERIES, window_days: int | None = None,
+                     step_days: int = 30, from_date: datetime | None = None, to_date: datetime | None = None,
+                     heating_bases: np.ndarray = DEFAULT_HEATING_BASES,
+                     cooling_bases: np.ndarray = DEFAULT_COOLING_BASES) -> pd.DataFrame:
+        # rolling fits of the stored frame, or a single fit of the date range when window_days is None.  The
+        # frame returned is shared by later calls and must not be modified in place.
+        cache_key = (datastore_path.resolve().__str__(), key.lstrip('/'), self.version(datastore_path, key),
+                     window_days, step_days, from_date, to_date, tuple(heating_bases), tuple(cooling_bases))
+        with self._lock:
+            if cache_key in self._fits:
+                self._fits.move_to_end(cache_key)
+                return self._fits[cache_key]
+        with pd.HDFStore(datastore_path.__str__(), mode='r') as ds:
+            daily_df = ds.select(key, where=date_range_where(from_date, to_date))
+        with span('degree day fit', rows=len(daily_df)):
+            fits_df = rolling_fits(daily_df, window_days, step_days, heating_bases, cooling_bases)
+        with self._lock:
+            self._fits[cache_key] = fits_df
+            while len(self._fits) > self.max_fits:
+                self._fits.popitem(last=False)
+        return fits_df
+
+    def clear(self):
+        with self._lock:
+            self._fits.clear()
+
+
+degree_day_cache = DegreeDayCache()
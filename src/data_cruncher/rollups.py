@@ -0,0 +1,203 @@
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_cruncher.usage_data import (BACKEND_MATRIX, HOURLY_SERIES, OVERLAP_NEWEST, OVERLAP_OLDEST, qtr_hr_fields,
+                                      date_range_where, series_backend, to_wide_format)
+from data_cruncher.usage_matrix import UsageMatrix, matrix_folder
+
+PERIOD_DAILY = 'Daily'
+PERIOD_WEEKLY = 'Weekly'
+PERIOD_MONTHLY = 'Monthly'
+PERIOD_BILLING = 'Billing'
+PERIODS: list[str] = [PERIOD_DAILY, PERIOD_WEEKLY, PERIOD_MONTHLY, PERIOD_BILLING]
+PROFILE_WEEKDAY = 'Weekday'
+PROFILE_MONTH = 'Month'
+PROFILES: list[str] = [PROFILE_WEEKDAY, PROFILE_MONTH]
+# number of distinct keys of each profile: Monday = 0 weekdays and January = 0 months
+PROFILE_KEYS: dict[str, int] = {PROFILE_WEEKDAY: 7, PROFILE_MONTH: 12}
+# columns of every period's totals, the daily rollup also keeps each day's readings checksum
+TOTALS_COLUMNS: list[str] = ['Date', 'total', 'days']
+CHECKSUM_COL = 'checksum'
+
+
+def series_suffix(series: str) -> str:
+    # the rollups of the continuous series keep the bare keys, those of a meter's series are named after it
+    return '' if series == HOURLY_SERIES else f'-{series}'
+
+
+def rollup_key(period: str, series: str = HOURLY_SERIES) -> str:
+    return f'Rollup-{period}{series_suffix(series)}'
+
+
+def profile_key(profile: str, series: str = HOURLY_SERIES) -> str:
+    return f'Profile-{profile}{series_suffix(series)}'
+
+
+def period_starts(dates: np.ndarray, period: str, billing_day: int = 1) -> np.ndarray:
+    # first day of the period each date falls in, weeks start on Monday and billing cycles on billing_day
+    days: np.ndarray = dates.astype('datetime64[D]')
+    if period == PERIOD_DAILY:
+        return days
+    if period == PERIOD_WEEKLY:
+        # 1970-01-01 was a Thursday
+        return days - (days.astype('int64') + 3) % 7
+    months: np.ndarray = days.astype('datetime64[M]')
+    if period == PERIOD_MONTHLY:
+        return months.astype('datetime64[D]')
+    cycle_starts: np.ndarray = months.astype('datetime64[D]') + (billing_day - 1)
+    earlier: np.ndarray = days < cycle_starts
+    cycle_starts[earlier] = (months[earlier] - 1).astype('datetime64[D]') + (billing_day - 1)
+    return cycle_starts
+
+
+def period_totals(dates: np.ndarray, totals: np.ndarray, period: str, billing_day: int = 1) -> pd.DataFrame:
+    starts = period_starts(dates, period, billing_day)
+    period_df = pd.DataFrame({'Date': starts.astype('datetime64[ns]'), 'total': totals, 'days': 1})
+    return period_df.groupby('Date', as_index=False).sum()
+
+
+def day_checksums(values: np.ndarray) -> np.ndarray:
+    # a digest of each day's interval readings, missing readings included
+    return pd.util.hash_pandas_object(pd.DataFrame(values), index=False).to_numpy()
+
+
+def profile_stats(dates: np.ndarray, values: np.ndarray, profile: str) -> np.ndarray:
+    #
+    # reading count, sum, min and max for each (profile key, interval), shaped (keys, intervals, 4).  The
+    # loop is over the 7 weekdays or 12 months, each one reduced as a block of days.
+    #
+    days: np.ndarray = dates.astype('datetime64[D]')
+    if profile == PROFILE_WEEKDAY:
+        keys: np.ndarray = (days.astype('int64') + 3) % 7
+    else:
+        keys = days.astype('datetime64[M]').astype('int64') % 12
+    stats: np.ndarray = np.zeros((PROFILE_KEYS[profile], values.shape[1], 4))
+    stats[:, :, 2:] = np.nan
+    for key in range(PROFILE_KEYS[profile]):
+        block: np.ndarray = values[keys == key]
+        present: np.ndarray = ~np.isnan(block)
+        stats[key, :, 0] = present.sum(axis=0)
+        stats[key, :, 1] = np.where(present, block, 0.0).sum(axis=0)
+        stats[key, :, 2] = np.fmin.reduce(block, axis=0, initial=np.nan)
+        stats[key, :, 3] = np.fmax.reduce(block, axis=0, initial=np.nan)
+    return stats
+
+
+def profile_frame(stats: np.ndarray) -> pd.DataFrame:
+    keys, intervals = np.meshgrid(np.arange(stats.shape[0]), np.arange(stats.shape[1]), indexing='ij')
+    return pd.DataFrame({'key': keys.ravel(), 'interval': intervals.ravel(),
+                         'count': stats[:, :, 0].ravel(), 'sum': stats[:, :, 1].ravel(),
+                         'min': stats[:, :, 2].ravel(), 'max': stats[:, :, 3].ravel()})
+
+
+def frame_profile_stats(profile_df: pd.DataFrame, profile: str) -> np.ndarray:
+    return profile_df[['count', 'sum', 'min', 'max']].to_numpy(dtype='float64').reshape(
+        PROFILE_KEYS[profile], len(qtr_hr_fields), 4)
+
+
+class UsageRollups:
+    #
+    # daily, weekly, monthly and billing cycle totals plus weekday x interval and month x interval profiles of
+    # one hourly series, the continuous series by default, materialized in the data store next to it.  New
+    # days are folded into the stored rollups without revisiting the days already rolled up.
+    #
+    def __init__(self, datastore_path: Path, billing_day: int = 1, series: str = HOURLY_SERIES):
+        if billing_day < 1 or billing_day > 28:
+            raise ValueError('Billing day must be between 1 and 28.')
+        self.datastore_path: Path = datastore_path
+        self.billing_day: int = billing_day
+        self.series: str = series
+
+    def for_series(self, series: str) -> 'UsageRollups':
+        return self if series == self.series else UsageRollups(self.datastore_path, self.billing_day, series)
+
+    def exists(self) -> bool:
+        # whether the store holds the series to roll up, as a table or a usage matrix
+        return series_backend(self.datastore_path, self.series) is not None
+
+    def totals(self, period: str, from_date: datetime | None = None, to_date: datetime | None = None) -> pd.DataFrame:
+        # the store itself doesn't exist yet when a usage matrix is the only series ingested
+        if not self.datastore_path.exists():
+            return pd.DataFrame({'Date': pd.Series(dtype='datetime64[ns]'), 'total': [], 'days': []})
+        with pd.HDFStore(self.datastore_path.__str__(), mode='r') as ds:
+            if rollup_key(period, self.series) not in ds:
+                return pd.DataFrame({'Date': pd.Series(dtype='datetime64[ns]'), 'total': [], 'days': []})
+            return ds.select(rollup_key(period, self.series), where=date_range_where(from_date, to_date),
+                             columns=TOTALS_COLUMNS)
+
+    def profile(self, profile: str) -> pd.DataFrame:
+        # one row per (key, interval) with the reading count, sum, min and mean and max
+        with pd.HDFStore(self.datastore_path.__str__(), mode='r') as ds:
+            profile_df = ds[profile_key(profile, self.series)]
+        profile_df['mean'] = profile_df['sum'] / profile_df['count']
+        return profile_df
+
+    def update(self, grid_df: pd.DataFrame, overlap: str = OVERLAP_NEWEST):
+        #
+        # fold the days of a (Date + intervals) grid into the rollups.  Days already rolled up are skipped when
+        # their readings' checksums are unchanged or when the overlap rule keeps the stored days.  Changed days
+        # under the newest wins rule can't be taken back out of the profile minimums and maximums, so the
+        # rollups are rebuilt from the stored hourly series instead, as are rollups stored without checksums.
+        #
+        if overlap not in [OVERLAP_NEWEST, OVERLAP_OLDEST]:
+            raise ValueError(f'{overlap} is not a valid overlap rule.')
+        values: np.ndarray = grid_df[qtr_hr_fields].to_numpy(dtype='float64')
+        dates: np.ndarray = grid_df['Date'].to_numpy(dtype='datetime64[ns]')
+        totals: np.ndarray = np.where(np.isnan(values), 0.0, values).sum(axis=1)
+        checksums: np.ndarray = day_checksums(values)
+        daily_df = None
+        if self.datastore_path.exists():
+            with pd.HDFStore(self.datastore_path.__str__(), mode='r') as ds:
+                daily_key = rollup_key(PERIOD_DAILY, self.series)
+                daily_df = ds[daily_key] if daily_key in ds else None
+        if daily_df is not None and CHECKSUM_COL not in daily_df:
+            self.rebuild()
+            return
+        known: np.ndarray = np.zeros(len(dates), dtype=bool) if daily_df is None else \
+            np.isin(dates, daily_df['Date'].to_numpy(dtype='datetime64[ns]'))
+        if overlap == OVERLAP_NEWEST and known.any():
+            stored_checksums = daily_df.set_index('Date')[CHECKSUM_COL].reindex(dates[known]).to_numpy()
+            if not np.array_equal(stored_checksums, checksums[known]):
+                self.rebuild()
+                return
+        self._add(dates[~known], totals[~known], values[~known], checksums[~known], replace=False)
+
+    def rebuild(self):
+        backend = series_backend(self.datastore_path, self.series)
+        if backend is None:
+            raise ValueError(f'{self.datastore_path} holds no {self.series} series to roll up.')
+        if backend == BACKEND_MATRIX:
+            grid_df = UsageMatrix(matrix_folder(self.datastore_path), self.series).frame()
+        else:
+            with pd.HDFStore(self.datastore_path.__str__(), mode='r') as ds:
+                grid_df = to_wide_format(ds[self.series])
+        values: np.ndarray = grid_df[qtr_hr_fields].to_numpy(dtype='float64')
+        totals: np.ndarray = np.where(np.isnan(values), 0.0, values).sum(axis=1)
+        self._add(grid_df['Date'].to_numpy(dtype='datetime64[ns]'), totals, values, day_checksums(values),
+                  replace=True)
+
+    def _add(self, dates: np.ndarray, totals: np.ndarray, values: np.ndarray, checksums: np.ndarray, replace: bool):
+        if len(dates) == 0 and not replace:
+            return
+        with pd.HDFStore(self.datastore_path.__str__()) as ds:
+            for period in PERIODS:
+                period_df = period_totals(dates, totals, period, self.billing_day)
+                if period == PERIOD_DAILY:
+                    # one row per date, the checksums line up with the dates grouped in order
+                    period_df[CHECKSUM_COL] = checksums[np.argsort(dates, kind='stable')]
+                if not replace and rollup_key(period, self.series) in ds:
+                    period_df = pd.concat([ds[rollup_key(period, self.series)], period_df], ignore_index=True)
+                    period_df = period_df.groupby('Date', as_index=False).sum()
+                ds.put(rollup_key(period, self.series), period_df, format='table', data_columns=['Date'])
+            for profile in PROFILES:
+                stats = profile_stats(dates, values, profile)
+                if not replace and profile_key(profile, self.series) in ds:
+                    stored = frame_profile_stats(ds[profile_key(profile, self.series)], profile)
+                    stats = np.stack((stored[:, :, 0] + stats[:, :, 0],
+                                      stored[:, :, 1] + stats[:, :, 1],
+                                      np.fmin(stored[:, :, 2], stats[:, :, 2]),
+                                      np.fmax(stored[:, :, 3], stats[:, :, 3])), axis=2)
+                ds.put(profile_key(profile, self.series), profile_frame(stats), format='table')
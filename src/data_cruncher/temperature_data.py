@@ -1,11 +1,17 @@
 from cmath import isnan
 from datetime import datetime
-from http.client import HTTPResponse
-import json
 from pathlib import Path
 import re
-from urllib.request import urlopen
+import numpy as np
 import pandas as pd
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+from data_cruncher.tracing import span
+from data_retrieval.temperature_cache import TemperatureCache
+from data_retrieval.visual_crossing import VisualCrossingClient, VISUAL_CROSSING_URL
 
 DATE_COL = 'Date'
 MIN_TEMP_COL = 'Min'
@@ -13,73 +19,183 @@ MAX_TEMP_COL = 'Max'
 AVE_TEMP_COL = 'Avg'
 
 
-def to_float(x: str):
-    return float(x.strip(','))
+# Visual Crossing daily entry fields, in column order
+VC_FIELDS: list[str] = ['datetime', 'tempmin', 'tempmax', 'temp']
+
+
+# SC ACIS listing columns kept, by header with the trailing comma removed
+ACIS_RENAME_MAP: dict[str, str] = {'Date': DATE_COL,
+                                   'MaxTemperature': MAX_TEMP_COL,
+                                   'MinTemperature': MIN_TEMP_COL,
+                                   'AvgTemperature': AVE_TEMP_COL}
+ACIS_DATE_FORMAT = '%Y-%m-%d'
+ACIS_SUFFIXES: list[str] = ['.csv', '.txt', '.json']
+
+
+def clean_acis_frame(daily_temp_df: pd.DataFrame, date_format: str = ACIS_DATE_FORMAT) -> pd.DataFrame:
+    #
+    # SC ACIS listings end headers and values with commas.  Strip them column wide and convert, 'M' (missing)
+    # and 'T' (trace) readings become NaN.
+    #
+    daily_temp_df.columns = daily_temp_df.columns.astype(str).str.strip().str.rstrip(',')
+    daily_temp_df = daily_temp_df[list(ACIS_RENAME_MAP)].rename(columns=ACIS_RENAME_MAP)
+    for column in [MIN_TEMP_COL, MAX_TEMP_COL, AVE_TEMP_COL]:
+        daily_temp_df[column] = pd.to_numeric(daily_temp_df[column].astype(str).str.rstrip(','),
+                                              errors='coerce').astype('float64')
+    daily_temp_df[DATE_COL] = pd.to_datetime(daily_temp_df[DATE_COL].astype(str).str.rstrip(','), format=date_format)
+    return daily_temp_df
+
+
+def is_acis_header(line: str) -> bool:
+    # a listing header names every kept column, separated by commas and/or whitespace
+    return set(ACIS_RENAME_MAP) <= set(re.split(r'[\s,]+', line.strip()))
+
+
+def read_acis_file(acis_path: Path) -> pd.DataFrame | None:
+    #
+    # .csv exports are comma separated, .txt files hold the whitespace separated listing as copied from the page
+    # and .json files the ACIS web services response for the elements maxt, mint and avgt.  Files that are not
+    # SC ACIS listings, such as the Visual Crossing payloads kept in the same folder, give None.
+    #
+    if acis_path.suffix == '.json':
+        payload = json_loads(acis_path.read_bytes())
+        if not isinstance(payload, dict) or not isinstance(payload.get('data'), list):
+            return None
+        return pd.DataFrame(payload['data'], columns=list(ACIS_RENAME_MAP), dtype=str)
+    with acis_path.open(errors='replace') as acis_file:
+        if not is_acis_header(acis_file.readline()):
+            return None
+    if acis_path.suffix == '.txt':
+        return pd.read_csv(acis_path, sep=r'\s+', dtype=str)
+    return pd.read_csv(acis_path, dtype=str, index_col=False, skipinitialspace=True)
+
+
+def vc_days_to_frame(daily_temps: list[dict]) -> pd.DataFrame:
+    # convert Visual Crossing daily entries to Date/Min/Max/Avg columns in one step
+    daily_temp_df = pd.DataFrame.from_records(daily_temps, columns=VC_FIELDS)
+    daily_temp_df.columns = [DATE_COL, MIN_TEMP_COL, MAX_TEMP_COL, AVE_TEMP_COL]
+    daily_temp_df[DATE_COL] = pd.to_datetime(daily_temp_df[DATE_COL], format='%Y-%m-%d')
+    return daily_temp_df.astype({MIN_TEMP_COL: 'float64', MAX_TEMP_COL: 'float64', AVE_TEMP_COL: 'float64'})
 
 
 class TemperatureData:
 
     def __init__(self, source: str, data_frame: pd.DataFrame, from_date: datetime, to_date: datetime):
         self.source: str = source
-        self.data_frame: pd.DataFrame = (
-            data_frame)[(data_frame[DATE_COL] >= from_date) & (data_frame[DATE_COL] <= to_date)]
+        # the days are kept in date order so the range is a slice found by binary search
+        if not data_frame[DATE_COL].is_monotonic_increasing:
+            data_frame = data_frame.sort_values(DATE_COL, kind='stable')
+        # open ranges are passed as datetime.min and datetime.max, past the ends of pandas' nanosecond range
+        dates: np.ndarray = data_frame[DATE_COL].to_numpy(dtype='datetime64[ns]')
+        first = max(pd.Timestamp(from_date), pd.Timestamp.min.ceil('D')).as_unit('ns')
+        last = min(pd.Timestamp(to_date), pd.Timestamp.max.floor('D')).as_unit('ns')
+        start = np.searchsorted(dates, first.to_datetime64(), side='left')
+        stop = np.searchsorted(dates, last.to_datetime64(), side='right')
+        self.data_frame: pd.DataFrame = data_frame.iloc[start:stop]
         self.from_date: datetime = from_date
         self.to_date: datetime = to_date
+        self._indexed: pd.DataFrame | None = None
+
+    @property
+    def indexed(self) -> pd.DataFrame:
+        # the readings indexed by date, one row per day with the last reading of a repeated day kept
+        if self._indexed is None:
+            indexed_df = self.data_frame.set_index(DATE_COL)
+            self._indexed = indexed_df[~indexed_df.index.duplicated(keep='last')]
+        return self._indexed
+
+    def join(self, usage_df: pd.DataFrame) -> pd.DataFrame:
+        #
+        # usage_df with the temperature columns of each of its days added, NaN for days without readings.  The
+        # readings are looked up on the sorted date index rather than merged, which gives the rows and columns
+        # of a left merge on Date.
+        #
+        temps_df = self.indexed.reindex(pd.DatetimeIndex(usage_df[DATE_COL]))
+        joined_df = usage_df.reset_index(drop=True)
+        for column in temps_df.columns:
+            joined_df[column] = temps_df[column].to_numpy()
+        return joined_df
 
 
 class TemperatureDataFactory:
 
     @classmethod
     def from_nws_spreadsheet(cls, data_path: Path, from_date: datetime, to_date: datetime):
-        daily_temp_df: pd.DataFrame = pd.read_excel(data_path)
-        daily_temp_df['Date'] = pd.to_datetime(daily_temp_df['Date'], format='%Y-%m-%d')
+        with span('temperature read') as stage:
+            daily_temp_df: pd.DataFrame = pd.read_excel(data_path)
+            daily_temp_df['Date'] = pd.to_datetime(daily_temp_df['Date'], format='%Y-%m-%d')
+            stage.rows = len(daily_temp_df)
         return TemperatureData(source='NWS', data_frame=daily_temp_df, from_date=from_date, to_date=to_date)
 
     @classmethod
-    def from_sc_acis_clipboard(self, source: str, from_date: datetime, to_date: datetime):
-        daily_temp_df: pd.DataFrame = pd.read_clipboard()
-        drop_list = ['AvgTemperatureDeparture,',
-                     'HDD,',
-                     'CDD,',
-                     'Precipitation,',
-                     'Snowfall,',
-                     'SnowDepth',
-                     ]
-        daily_temp_df.drop(columns=drop_list, inplace=True)
-        rename_map: dict[str, str] = {'Date,': DATE_COL,
-                                      'MaxTemperature,': MAX_TEMP_COL,
-                                      'MinTemperature,': MIN_TEMP_COL,
-                                      'AvgTemperature,': AVE_TEMP_COL}
-
-        daily_temp_df.rename(mapper=rename_map, axis=1, inplace=True)
-        daily_temp_df[DATE_COL] = pd.to_datetime(daily_temp_df[DATE_COL], format='mixed')
-        daily_temp_df[MIN_TEMP_COL] = daily_temp_df[MIN_TEMP_COL].apply(func=to_float)
-        daily_temp_df[MAX_TEMP_COL] = daily_temp_df[MAX_TEMP_COL].apply(func=to_float)
-        daily_temp_df[AVE_TEMP_COL] = daily_temp_df[AVE_TEMP_COL].apply(func=to_float)
+    def from_sc_acis_clipboard(self, source: str, from_date: datetime, to_date: datetime,
+                               date_format: str = ACIS_DATE_FORMAT):
+        daily_temp_df: pd.DataFrame = clean_acis_frame(pd.read_clipboard(dtype=str), date_format)
         return TemperatureData(source=source, data_frame=daily_temp_df, from_date=from_date, to_date=to_date)
 
     @classmethod
-    def from_visual_crossing(cls, latitude: int, longitude: int, from_date: datetime, to_date: datetime, passkey: str):
-        url = f"https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline/" \
-            f"{latitude},{longitude}/{from_date.strftime('%Y-%m-%d')}/{to_date.strftime('%Y-%m-%d')}" \
-            f"?key={passkey}&include=days&elements=datetime,tempmax,tempmin,temp"
-        response: HTTPResponse = urlopen(url)
-        payload = json.loads(response.read())
-        daily_temps = payload['days']
-        data: dict[str, list[datetime | float]] = {}
-        data[DATE_COL]: list[datetime] = []
-        data[MIN_TEMP_COL]: list[float] = []
-        data[MAX_TEMP_COL]: list[float] = []
-        data[AVE_TEMP_COL]: list[float] = []
-        for daily_temp in daily_temps:
-            data[DATE_COL].append(datetime.strptime(daily_temp['datetime'], '%Y-%m-%d'))
-            data[MIN_TEMP_COL].append(daily_temp['tempmin'])
-            data[MAX_TEMP_COL].append(daily_temp['tempmax'])
-            data[AVE_TEMP_COL].append(daily_temp['temp'])
-        daily_temp_df = pd.DataFrame(data)
+    def from_sc_acis_files(cls, acis_path: Path, from_date: datetime, to_date: datetime,
+                           date_format: str = ACIS_DATE_FORMAT, source: str = 'SC ACIS'):
+        #
+        # load an exported SC ACIS listing, or every listing in a folder.  Files are read oldest first so
+        # where their days overlap the most recently saved file wins.
+        #
+        if acis_path.is_dir():
+            acis_paths = sorted([path for path in acis_path.iterdir() if path.suffix in ACIS_SUFFIXES],
+                                key=lambda path: path.stat().st_mtime)
+        else:
+            acis_paths = [acis_path]
+        with span('temperature read') as stage:
+            # each file is read once, the read itself tells listings from the other files in the folder
+            acis_dfs = [acis_df for acis_df in map(read_acis_file, acis_paths) if acis_df is not None]
+            if len(acis_dfs) == 0:
+                raise FileNotFoundError(f'No SC ACIS listings found in {acis_path}.')
+            daily_temp_df = pd.concat([clean_acis_frame(acis_df, date_format) for acis_df in acis_dfs],
+                                      ignore_index=True)
+            daily_temp_df = daily_temp_df.drop_duplicates(subset=DATE_COL, keep='last').sort_values(DATE_COL)
+            stage.rows = len(daily_temp_df)
+        return TemperatureData(source=source, data_frame=daily_temp_df.reset_index(drop=True),
+                               from_date=from_date, to_date=to_date)
+
+    @classmethod
+    def from_visual_crossing(cls, latitude: int, longitude: int, from_date: datetime, to_date: datetime, passkey: str,
+                             cache: TemperatureCache | None = None, base_url: str = VISUAL_CROSSING_URL,
+                             client: VisualCrossingClient | None = None):
+        # long ranges are fetched as concurrent chunks, a client given by the caller is left open for its next use
+        own_client = client is None
+        client = VisualCrossingClient(passkey, base_url) if own_client else client
+        try:
+            with span('temperature fetch') as stage:
+                if cache is None:
+                    daily_temps = client.fetch_range(latitude, longitude, from_date, to_date)
+                else:
+                    # only the days the cache is missing, or holds stale values for, are requested
+                    missing = cache.missing_ranges(latitude, longitude, from_date, to_date)
+                    cache.put(latitude, longitude, client.fetch_ranges(latitude, longitude, missing))
+                    daily_temps = cache.days(latitude, longitude, from_date, to_date)
+                stage.rows = len(daily_temps)
+        finally:
+            if own_client:
+                client.close()
+        daily_temp_df = vc_days_to_frame(daily_temps)
         return TemperatureData(source="Visual Crossing", data_frame=daily_temp_df, from_date=from_date, to_date=to_date)
 
-    def from_local(self, from_date: datetime, to_date: datetime):
-        ...
+    @classmethod
+    def from_local(cls, input_data_folder: Path, from_date: datetime, to_date: datetime):
+        #
+        # load every saved Visual Crossing payload in the input data folder.  Files are read oldest first so
+        # where their days overlap the most recently saved file wins.
+        #
+        daily_temps: list[dict] = []
+        with span('temperature read') as stage:
+            for json_path in sorted(input_data_folder.glob('*.json'), key=lambda path: path.stat().st_mtime):
+                payload = json_loads(json_path.read_bytes())
+                if isinstance(payload, dict) and isinstance(payload.get('days'), list):
+                    daily_temps.extend(payload['days'])
+            daily_temp_df = vc_days_to_frame(daily_temps)
+            daily_temp_df = daily_temp_df.drop_duplicates(subset=DATE_COL, keep='last').sort_values(DATE_COL)
+            stage.rows = len(daily_temp_df)
+        return TemperatureData(source="Visual Crossing", data_frame=daily_temp_df.reset_index(drop=True),
+                               from_date=from_date, to_date=to_date)
 
 
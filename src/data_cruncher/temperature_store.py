@@ -0,0 +1,146 @@
+from datetime import datetime
+from pathlib import Path
+import re
+
+import numpy as np
+import pandas as pd
+
+from data_cruncher.temperature_data import AVE_TEMP_COL, DATE_COL, MAX_TEMP_COL, MIN_TEMP_COL, TemperatureData
+from data_cruncher.tracing import span
+
+SOURCE_NWS = 'NWS'
+SOURCE_SC_ACIS = 'SC ACIS'
+SOURCE_VISUAL_CROSSING = 'Visual Crossing'
+# where several sources hold a day the earliest listed wins: station observations before gridded values
+DEFAULT_PRECEDENCE: list[str] = [SOURCE_NWS, SOURCE_SC_ACIS, SOURCE_VISUAL_CROSSING]
+TEMP_COLUMNS: list[str] = [MIN_TEMP_COL, MAX_TEMP_COL, AVE_TEMP_COL]
+SOURCE_COL = 'Source'
+STORE_SOURCE = 'Temperature Store'
+TEMPS_KEY_PREFIX = 'Temps-'
+
+
+def temps_key(source: str) -> str:
+    return TEMPS_KEY_PREFIX + re.sub(r'[^0-9A-Za-z]', '', source)
+
+
+def index_range_where(from_date: datetime | None, to_date: datetime | None) -> list[str] | None:
+    # HDFStore.select condition on a table's date index
+    where: list[str] = []
+    if from_date is not None:
+        where.append(f'index >= "{from_date.strftime("%Y-%m-%d")}"')
+    if to_date is not None:
+        where.append(f'index <= "{to_date.strftime("%Y-%m-%d")}"')
+    return where if len(where) > 0 else None
+
+
+def indexed_temps(temp_df: pd.DataFrame) -> pd.DataFrame:
+    #
+    # a source's readings as Min/Max/Avg indexed by day, in date order with one row per day.  NWS spreadsheets
+    # name the average temperature column Average, the other sources Avg.
+    #
+    temp_df = temp_df.rename(columns={'Average': AVE_TEMP_COL})
+    dates = pd.DatetimeIndex(temp_df[DATE_COL]).normalize().astype('datetime64[ns]')
+    indexed_df = pd.DataFrame({column: temp_df[column].to_numpy(dtype='float64') if column in temp_df.columns
+                               else np.full(len(temp_df), np.nan) for column in TEMP_COLUMNS},
+                              index=dates.rename(DATE_COL))
+    indexed_df = indexed_df[indexed_df.index.notna()]
+    indexed_df = indexed_df[~indexed_df.index.duplicated(keep='last')]
+    return indexed_df.sort_index(kind='stable')
+
+
+class TemperatureStore:
+    #
+    # daily temperatures from every source, kept in the data store as one date indexed table per source.  A
+    # range read takes each day from the first source in the precedence holding a reading for it, so usage
+    # can be given weather from whichever sources were loaded without merging them by hand.
+    #
+    def __init__(self, datastore_path: Path, precedence: list[str] | None = None):
+        self.datastore_path: Path = datastore_path
+        self.precedence: list[str] = list(DEFAULT_PRECEDENCE if precedence is None else precedence)
+
+    def sources(self) -> list[str]:
+        # the stored sources, in precedence order with any sources outside it last
+        if not self.datastore_path.exists():
+            return []
+        with pd.HDFStore(self.datastore_path.__str__(), mode='r') as ds:
+            stored: list[str] = [ds.get_storer(key).attrs.source for key in ds.keys()
+                                 if key.lstrip('/').startswith(TEMPS_KEY_PREFIX)]
+        return self.ordered(stored)
+
+    def ordered(self, sources: list[str]) -> list[str]:
+        return [source for source in self.precedence if source in sources] + \
+            sorted(source for source in sources if source not in self.precedence)
+
+    def put(self, temperature_data: TemperatureData) -> int:
+        #
+        # add a source's readings to its table, where a day is already stored the new readings replace it.
+        # Returns the days the source now holds.
+        #
+        incoming_df = indexed_temps(temperature_data.data_frame)
+        if len(incoming_df) == 0:
+            return 0
+        key = temps_key(temperature_data.source)
+        with span('temperature store put', rows=len(incoming_df)), pd.HDFStore(self.datastore_path.__str__()) as ds:
+            if key in ds:
+                stored_df = ds[key]
+                incoming_df = pd.concat([stored_df[~stored_df.index.isin(incoming_df.index)], incoming_df])
+                incoming_df = incoming_df.sort_index(kind='stable')
+            # rewritten whole so the table stays in date order
+            ds.put(key, incoming_df, format='table')
+            ds.get_storer(key).attrs.source = temperature_data.source
+        return len(incoming_df)
+
+    def range(self, from_date: datetime | None = None, to_date: datetime | None = None,
+              sources: list[str] | None = None, incoming: TemperatureData | None = None) -> pd.DataFrame:
+        #
+        # one row per day of the range held by any of the sources, Min/Max/Avg and the source they came from,
+        # indexed by date.  Days are taken whole from the first source in precedence order with a reading.
+        # Readings not stored yet are given as incoming and used as put would store them.
+        #
+        sources = self.sources() if sources is None else sources
+        if incoming is not None and incoming.source not in sources:
+            sources = self.ordered(sources + [incoming.source])
+        frames: list[pd.DataFrame] = []
+        with span('temperature store range') as stage:
+            ds = pd.HDFStore(self.datastore_path.__str__(), mode='r') if self.datastore_path.exists() else None
+            try:
+                for rank, source in enumerate(sources):
+                    # incoming days come first, so they replace the stored readings of the same days
+                    source_frames: list[pd.DataFrame] = []
+                    if incoming is not None and source == incoming.source:
+                        source_frames.append(indexed_temps(incoming.data_frame).loc[from_date:to_date])
+                    if ds is not None and temps_key(source) in ds:
+                        source_frames.append(ds.select(temps_key(source),
+                                                       where=index_range_where(from_date, to_date)))
+                    for source_df in source_frames:
+                        source_df = source_df[source_df[TEMP_COLUMNS].notna().any(axis=1)]
+                        frames.append(source_df.assign(**{SOURCE_COL: source, 'rank': rank}))
+            finally:
+                if ds is not None:
+                    ds.close()
+            if len(frames) == 0:
+                return pd.DataFrame({**{column: pd.Series(dtype='float64') for column in TEMP_COLUMNS},
+                                     SOURCE_COL: pd.Series(dtype='object')},
+                                    index=pd.DatetimeIndex([], dtype='datetime64[ns]', name=DATE_COL))
+            range_df = pd.concat(frames)
+            # each source is in date order, one sort by (date, rank) puts the day to keep first
+            order = np.lexsort((range_df['rank'].to_numpy(), range_df.index.to_numpy(dtype='datetime64[ns]')))
+            range_df = range_df.iloc[order]
+            range_df = range_df[~range_df.index.duplicated(keep='first')].drop(columns='rank')
+            stage.rows = len(range_df)
+        return range_df
+
+    def temperature_data(self, from_date: datetime | None = None, to_date: datetime | None = None,
+                         sources: list[str] | None = None, incoming: TemperatureData | None = None) -> TemperatureData:
+        # the range as TemperatureData for the daily usage factories, an open end takes every stored day
+        temp_df = self.range(from_date, to_date, sources, incoming).drop(columns=SOURCE_COL).reset_index()
+        return TemperatureData(source=STORE_SOURCE, data_frame=temp_df,
+                               from_date=datetime.min if from_date is None else from_date,
+                               to_date=datetime.max if to_date is None else to_date)
+
+    def join(self, usage_df: pd.DataFrame, sources: list[str] | None = None) -> pd.DataFrame:
+        # usage_df with the temperatures of its days added, reading only the range the usage covers
+        dates = usage_df[DATE_COL].dropna()
+        if len(dates) == 0:
+            return usage_df.reset_index(drop=True).assign(**{column: np.nan for column in TEMP_COLUMNS})
+        return self.temperature_data(dates.min().to_pydatetime(), dates.max().to_pydatetime(), sources).join(usage_df)
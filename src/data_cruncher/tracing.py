@@ -0,0 +1,238 @@
+import csv
+from datetime import datetime
+import json
+import os
+from pathlib import Path
+import threading
+from time import perf_counter, thread_time
+import tracemalloc
+from typing import Callable, NamedTuple
+
+# setting this to a .json or .csv path turns tracing on for the whole run and writes the trace there at exit
+TRACE_ENV = 'HOME_POWER_TRACE'
+TRACE_COLUMNS: list[str] = ['name', 'parent', 'depth', 'thread', 'offset', 'wall', 'cpu', 'rows', 'peak_bytes']
+
+
+class SpanRecord(NamedTuple):
+    # offset is the seconds from the tracer being enabled to the span starting, peak_bytes is None unless
+    # memory is traced
+    name: str
+    parent: str | None
+    depth: int
+    thread: str
+    offset: float
+    wall: float
+    cpu: float
+    rows: int | None
+    peak_bytes: int | None
+
+    def describe(self) -> str:
+        rows = '' if self.rows is None else f' {self.rows:,} rows'
+        peak = '' if self.peak_bytes is None else f' peak {self.peak_bytes / 2 ** 20:.1f} MB'
+        return f'{"  " * self.depth}{self.name}: {self.wall:.3f}s wall {self.cpu:.3f}s cpu{rows}{peak}'
+
+
+class NullSpan:
+    # what span returns while tracing is off, so an instrumented stage costs a call and an attribute check
+    rows: int | None = None
+
+    def __enter__(self) -> 'NullSpan':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    #
+    # one timed stage.  rows may be given up front or set inside the with block once the stage knows how many
+    # rows it handled.  With memory traced, the peak is the most traced memory above that at the start, nested
+    # spans fold their peaks into their parent's since tracemalloc keeps a single peak.
+    #
+    def __init__(self, tracer: 'Tracer', name: str, rows: int | None):
+        self.tracer: Tracer = tracer
+        self.name: str = name
+        self.rows: int | None = rows
+        self.parent: Span | None = None
+        self.depth: int = 0
+        self.child_peak: int = 0
+        self.start_memory: int = 0
+
+    def __enter__(self) -> 'Span':
+        stack = self.tracer.stack()
+        if len(stack) > 0:
+            self.parent = stack[-1]
+            self.depth = self.parent.depth + 1
+        stack.append(self)
+        if self.tracer.trace_memory:
+            if self.parent is not None:
+                self.parent.child_peak = max(self.parent.child_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self.start_memory = tracemalloc.get_traced_memory()[0]
+        self.start_cpu = thread_time()
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = perf_counter() - self.start
+        cpu = thread_time() - self.start_cpu
+        peak_bytes = None
+        if self.tracer.trace_memory:
+            peak = max(self.child_peak, tracemalloc.get_traced_memory()[1])
+            peak_bytes = max(peak - self.start_memory, 0)
+            if self.parent is not None:
+                self.parent.child_peak = max(self.parent.child_peak, peak)
+            tracemalloc.reset_peak()
+        self.tracer.stack().pop()
+        self.tracer.record(SpanRecord(self.name, None if self.parent is None else self.parent.name, self.depth,
+                                      threading.current_thread().name, self.start - self.tracer.started, wall, cpu,
+                                      self.rows, peak_bytes))
+        return False
+
+
+class Tracer:
+    #
+    # collects the spans of the instrumented stages.  Off until enabled, listeners are called with each
+    # finished span on the thread that ran it.
+    #
+    def __init__(self):
+        self.enabled: bool = False
+        self.trace_memory: bool = False
+        self.started: float = perf_counter()
+        self.records: list[SpanRecord] = []
+        self.listeners: list[Callable[[SpanRecord], None]] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def enable(self, trace_memory: bool = False):
+        # tracing memory makes every allocation slower, only ask for it when the peaks are wanted
+        if self.enabled:
+            return
+        self.started = perf_counter()
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.trace_memory = False
+
+    def span(self, name: str, rows: int | None = None) -> Span | NullSpan:
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, rows)
+
+    def stack(self) -> list[Span]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def record(self, span_record: SpanRecord):
+        with self._lock:
+            self.records.append(span_record)
+            listeners = list(self.listeners)
+        for listener in listeners:
+            listener(span_record)
+
+    def add_listener(self, listener: Callable[[SpanRecord], None]):
+        with self._lock:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[SpanRecord], None]):
+        with self._lock:
+            if listener in self.listeners:
+                self.listeners.remove(listener)
+
+    def clear(self):
+        with self._lock:
+            self.records = []
+
+    def write(self, trace_path: Path):
+        # JSON for a .json path, CSV for anything else, one row per span in the order they finished
+        with self._lock:
+            records = list(self.records)
+        if trace_path.suffix.lower() == '.json':
+            with trace_path.open(mode='w') as f:
+                json.dump({'written_at': datetime.now().isoformat(timespec='seconds'),
+                           'spans': [span_record._asdict() for span_record in records]}, f, indent=2)
+        else:
+            with trace_path.open(mode='w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(TRACE_COLUMNS)
+                writer.writerows(records)
+
+
+def read_trace(trace_path: Path) -> list[SpanRecord]:
+    if trace_path.suffix.lower() == '.json':
+        with trace_path.open(mode='r') as f:
+            return [SpanRecord(**span) for span in json.load(f)['spans']]
+    with trace_path.open(mode='r', newline='') as f:
+        return [SpanRecord(row['name'], row['parent'] or None, int(row['depth']), row['thread'], float(row['offset']),
+                           float(row['wall']), float(row['cpu']), int(row['rows']) if row['rows'] else None,
+                           int(row['peak_bytes']) if row['peak_bytes'] else None)
+                for row in csv.DictReader(f)]
+
+
+def stage_totals(records: list[SpanRecord]) -> dict[str, dict[str, float]]:
+    # the calls, wall and cpu seconds, rows and largest peak of each stage name
+    totals: dict[str, dict[str, float]] = {}
+    for span_record in records:
+        stage = totals.setdefault(span_record.name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'rows': 0,
+                                                     'peak_bytes': 0})
+        stage['calls'] += 1
+        stage['wall'] += span_record.wall
+        stage['cpu'] += span_record.cpu
+        stage['rows'] += span_record.rows or 0
+        stage['peak_bytes'] = max(stage['peak_bytes'], span_record.peak_bytes or 0)
+    return totals
+
+
+def compare_traces(before_path: Path, after_path: Path) -> list[str]:
+    # a line per stage with its wall time in each trace and the change
+    before = stage_totals(read_trace(before_path))
+    after = stage_totals(read_trace(after_path))
+    lines = [f'{"stage":<28} {"before":>9} {"after":>9} {"change":>8}']
+    for name in list(before) + [name for name in after if name not in before]:
+        before_wall = before.get(name, {}).get('wall')
+        after_wall = after.get(name, {}).get('wall')
+        change = '' if before_wall is None or after_wall is None or before_wall == 0 \
+            else f'{(after_wall - before_wall) / before_wall:+.0%}'
+        lines.append(f'{name:<28} {"" if before_wall is None else f"{before_wall:.4f}":>9} '
+                     f'{"" if after_wall is None else f"{after_wall:.4f}":>9} {change:>8}')
+    return lines
+
+
+tracer = Tracer()
+
+
+def span(name: str, rows: int | None = None) -> Span | NullSpan:
+    return tracer.span(name, rows)
+
+
+def trace_to(trace_path: Path, trace_memory: bool = False):
+    # enable tracing and write the trace to trace_path when the process exits
+    import atexit
+    tracer.enable(trace_memory)
+    atexit.register(tracer.write, trace_path)
+
+
+if os.environ.get(TRACE_ENV):
+    trace_to(Path(os.environ[TRACE_ENV]))
+
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) != 3:
+        print('usage: tracing.py BEFORE_TRACE AFTER_TRACE')
+        sys.exit(2)
+    for line in compare_traces(Path(sys.argv[1]), Path(sys.argv[2])):
+        print(line)
@@ -1,187 +1,688 @@
-from cmath import isnan
 from datetime import datetime, timedelta
+from operator import itemgetter
 from pathlib import Path
 import re
+from typing import Iterator, TYPE_CHECKING
 
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 
-from temperature_data import TemperatureData
+from data_cruncher.catalog import (DAILY_NAME_REGEX, HOURLY_NAME_REGEX, DataStoreCatalog, KIND_DAILY, KIND_HOURLY,
+                                   name_dates, stored_dates)
+from data_cruncher.temperature_data import AVE_TEMP_COL, MAX_TEMP_COL, MIN_TEMP_COL
+from data_cruncher.tracing import span
+from data_cruncher.workbook_cache import workbook_cache
+
+if TYPE_CHECKING:
+    from data_cruncher.temperature_data import TemperatureData
+    from data_cruncher.rollups import UsageRollups
+    from data_cruncher.usage_matrix import UsageMatrix
 
 #
-# build a list of time interval column headings
+# time interval column headings ('12:00 AM' to '11:45 PM') and the matching times of day.  The times fall on a
+# fixed day rather than the day of import, so frames built on different days line up.
 #
-qtr_hr_fields: list[str] = []
-qtr_hr_times: list[datetime] = []
-today = datetime.today()
-dt = datetime(year=today.year, month=today.month, day=today.day, hour=0, minute=0, second=0)
-delta = timedelta(hours=0, minutes=15, seconds=0)
-for i in range(0, 96):
-    fmt_time = dt.strftime('%I:%M %p')
-    if fmt_time[0:1] == '0':
-        fmt_time = fmt_time[1:]
-    qtr_hr_fields.append(fmt_time)
-    qtr_hr_times.append(dt)
-    dt = dt + delta
+TIME_OF_DAY_DATE = datetime(year=2000, month=1, day=1)
+qtr_hr_times: list[datetime] = [TIME_OF_DAY_DATE + timedelta(minutes=15 * i) for i in range(0, 96)]
+qtr_hr_fields: list[str] = [f'{(time.hour + 11) % 12 + 1}:{time.minute:02d} {"AM" if time.hour < 12 else "PM"}'
+                            for time in qtr_hr_times]
+
+# continuous series tables holding every ingested day
+HOURLY_SERIES = 'Hourly'
+DAILY_SERIES = 'Daily'
+# columns of the continuous daily series, the temperatures are NaN for days ingested without them
+DAILY_SERIES_COLUMNS: list[str] = ['Date', 'Total', MIN_TEMP_COL, MAX_TEMP_COL, AVE_TEMP_COL]
+
+def meter_series(series: str, meter: str) -> str:
+    # series table of one meter, for exports covering more than one.  Meter numbers are kept as text, leading
+    # zeros included, with anything that isn't a valid HDF node name character replaced.
+    return f'{series}-{re.sub(r"[^0-9A-Za-z_]+", "_", meter.strip())}'
+
+
+# how days already in a series table are resolved when an import covers them again
+OVERLAP_NEWEST = 'newest'
+OVERLAP_OLDEST = 'oldest'
+OVERLAP_RULES: list[str] = [OVERLAP_NEWEST, OVERLAP_OLDEST]
+
+# where an hourly series is kept: a table in the data store, or a memory mapped usage matrix beside it
+BACKEND_TABLE = 'table'
+BACKEND_MATRIX = 'matrix'
+BACKENDS: list[str] = [BACKEND_TABLE, BACKEND_MATRIX]
+
+# values of the categorical 'type' column, in category code order
+USAGE_TYPES: list[str] = ['actual', 'min', 'mean', 'max']
+# readings are kept to 0.01 kWh, which single precision holds exactly enough at half the memory
+USAGE_DTYPE = 'float32'
+
+
+def interval_stats(values: np.ndarray) -> np.ndarray:
+    #
+    # reading count, sum, min and max of each interval (column) of a (days x intervals) grid, NaN readings
+    # skipped.  These combine across grids without revisiting the readings, see combine_interval_stats.
+    #
+    present: np.ndarray = ~np.isnan(values)
+    return np.column_stack((present.sum(axis=0).astype('float64'),
+                            np.where(present, values, 0.0).sum(axis=0, dtype='float64'),
+                            np.fmin.reduce(values, axis=0, initial=np.nan),
+                            np.fmax.reduce(values, axis=0, initial=np.nan)))
+
+
+def combine_interval_stats(stats: list[np.ndarray], dropped: np.ndarray, kept: np.ndarray) -> np.ndarray:
+    #
+    # interval statistics of the union of several grids, less the dropped rows (days replaced by another grid).
+    # Counts and sums are adjusted by subtraction, min and max are only rescanned over the kept rows for the
+    # intervals where a dropped reading was the extreme.
+    #
+    combined: np.ndarray = np.column_stack((np.sum([stat[:, 0] for stat in stats], axis=0),
+                                            np.sum([stat[:, 1] for stat in stats], axis=0),
+                                            np.fmin.reduce([stat[:, 2] for stat in stats], axis=0),
+                                            np.fmax.reduce([stat[:, 3] for stat in stats], axis=0)))
+    if len(dropped) > 0:
+        present: np.ndarray = ~np.isnan(dropped)
+        combined[:, 0] -= present.sum(axis=0)
+        combined[:, 1] -= np.where(present, dropped, 0.0).sum(axis=0)
+        stale: np.ndarray = (dropped == combined[:, 2]).any(axis=0) | (dropped == combined[:, 3]).any(axis=0)
+        if stale.any():
+            combined[stale, 2] = np.fmin.reduce(kept[:, stale], axis=0, initial=np.nan)
+            combined[stale, 3] = np.fmax.reduce(kept[:, stale], axis=0, initial=np.nan)
+    return combined
+
+
+def to_long_format(usage_df: pd.DataFrame, stats: np.ndarray | None = None) -> pd.DataFrame:
+    #
+    # reshape the (days x intervals) usage grid into a long frame with one row per reading, ordered by
+    # interval: each interval's actual readings followed by that interval's min, mean and max.  The aggregates
+    # come from stats when the caller already has the grid's interval statistics.  Intervals are numbered 0 to
+    # 95 rather than stamped with a time of day, see with_time_of_day.
+    #
+    return grid_long_format(usage_df['Date'].to_numpy(dtype='datetime64[ns]'),
+                            usage_df[qtr_hr_fields].to_numpy(dtype='float64'), stats)
+
+
+def grid_long_format(dates: np.ndarray, grid: np.ndarray, stats: np.ndarray | None = None) -> pd.DataFrame:
+    # to_long_format of a (days x intervals) array and the date of each of its rows
+    stats = interval_stats(grid) if stats is None else stats
+    values: np.ndarray = grid.T
+    present: np.ndarray = ~np.isnan(values)
+    # NaN skipping min, mean and max of each interval, NaN when an interval has no readings
+    with np.errstate(invalid='ignore', divide='ignore'):
+        agg: np.ndarray = np.column_stack((stats[:, 2], stats[:, 1] / stats[:, 0], stats[:, 3]))
+    row_count = values.shape[1] + agg.shape[1]
+    # missing readings are dropped, aggregate rows are always kept
+    keep: np.ndarray = np.hstack((present, np.ones(agg.shape, dtype=bool))).ravel()
+    usage: np.ndarray = np.hstack((values, agg)).ravel()[keep]
+    codes: np.ndarray = np.tile(np.r_[np.zeros(values.shape[1], dtype='int8'), np.arange(1, 4, dtype='int8')],
+                                len(qtr_hr_fields))[keep]
+    intervals: np.ndarray = np.repeat(np.arange(len(qtr_hr_fields), dtype='uint8'), row_count)[keep]
+    # actual readings carry the date they were taken on, aggregate rows have no date
+    row_dates: np.ndarray = np.tile(np.concatenate((dates.astype('datetime64[ns]'),
+                                                    np.full(agg.shape[1], np.datetime64('NaT'),
+                                                            dtype='datetime64[ns]'))),
+                                    len(qtr_hr_fields))[keep]
+    return pd.DataFrame({'Date': row_dates,
+                         'interval': intervals,
+                         'usage': usage.astype(USAGE_DTYPE),
+                         'type': pd.Categorical.from_codes(codes, categories=USAGE_TYPES)})
+
+
+def to_wide_format(usage_df: pd.DataFrame) -> pd.DataFrame:
+    # rebuild the (days x intervals) usage grid from the actual readings of a long format frame
+    actual_df = compact_long_format(usage_df[usage_df['type'] == 'actual'])
+    intervals: np.ndarray = actual_df['interval'].to_numpy()
+    dates, date_rows = np.unique(actual_df['Date'].to_numpy(dtype='datetime64[ns]'), return_inverse=True)
+    values: np.ndarray = np.full((len(dates), len(qtr_hr_fields)), np.nan)
+    values[date_rows, intervals] = actual_df['usage'].to_numpy(dtype='float64')
+    wide_df = pd.DataFrame(values, columns=qtr_hr_fields)
+    wide_df.insert(0, 'Date', dates)
+    return wide_df
+
+
+def compact_long_format(usage_df: pd.DataFrame) -> pd.DataFrame:
+    #
+    # convert a long format frame saved with a time of day column to numbered intervals.  Frames saved before
+    # readings carried their date are given a missing Date, and types saved as strings become categorical.
+    #
+    if 'interval' in usage_df.columns:
+        return usage_df
+    usage_df = usage_df.assign(interval=(usage_df['time'].dt.hour * 4 + usage_df['time'].dt.minute // 15)
+                               .to_numpy().astype('uint8'),
+                               usage=usage_df['usage'].astype(USAGE_DTYPE),
+                               type=pd.Categorical(usage_df['type'].astype(str), categories=USAGE_TYPES))
+    if 'Date' not in usage_df.columns:
+        usage_df = usage_df.assign(Date=np.full(len(usage_df), np.datetime64('NaT'), dtype='datetime64[ns]'))
+    return usage_df[['Date', 'interval', 'usage', 'type']]
+
+
+def with_time_of_day(usage_df: pd.DataFrame) -> pd.DataFrame:
+    # a copy of a long format frame with the time column plotted against, built from the interval numbers
+    return usage_df.assign(time=np.array(qtr_hr_times, dtype='datetime64[ns]')[usage_df['interval'].to_numpy()])
+
+
+def date_range_where(from_date: datetime | None, to_date: datetime | None) -> list[str] | None:
+    # HDFStore.select condition on the indexed Date data column
+    where: list[str] = []
+    if from_date is not None:
+        where.append(f'Date >= "{from_date.strftime("%Y-%m-%d")}"')
+    if to_date is not None:
+        where.append(f'Date <= "{to_date.strftime("%Y-%m-%d")}"')
+    return where if len(where) > 0 else None
+
+
+def stored_date_range(ds: pd.HDFStore, name: str) -> tuple[datetime, datetime]:
+    # first and last date of a stored frame, reading only the Date column of a table
+    dates = stored_dates(ds, name)
+    dates = pd.Series(dtype='datetime64[ns]') if dates is None else dates.dropna()
+    if len(dates) == 0:
+        raise ValueError(f'{name} contains no dated usage data.')
+    return dates.min().to_pydatetime(), dates.max().to_pydatetime()
+
+
+def select_range(ds: pd.HDFStore, name: str, from_date: datetime, to_date: datetime) -> pd.DataFrame:
+    #
+    # the rows of a stored frame from from_date through to_date.  Tables are queried on their Date column,
+    # frames saved in fixed format before the store used tables are read whole and filtered, and frames
+    # without dates are returned whole.
+    #
+    if ds.get_storer(name).is_table:
+        return ds.select(name, where=date_range_where(from_date, to_date))
+    usage_df = ds[name]
+    if 'Date' not in usage_df.columns:
+        return usage_df
+    dates = usage_df['Date']
+    return usage_df[(dates >= pd.Timestamp(from_date.date())) & (dates <= pd.Timestamp(to_date.date()))]
+
+
+def entry_date_range(datastore_path: Path, ds: pd.HDFStore, regex: str, name: str) -> tuple[datetime, datetime]:
+    # the catalog knows the range of every entry it describes, dated entries also carry it in their name
+    # and as a last resort the table is asked for its range
+    entry = DataStoreCatalog(datastore_path).get(name)
+    if entry is not None:
+        return entry.from_date, entry.to_date
+    if re.search(regex, name) is not None:
+        return name_dates(regex, name)
+    return stored_date_range(ds, name)
+
+
+def append_series(datastore_path: Path, key: str, kind: str, data_frame: pd.DataFrame, data_columns: list[str],
+                  overlap: str = OVERLAP_NEWEST, source: str | None = None) -> int:
+    #
+    # append the days in data_frame to a continuous series table, resolving days that are already stored by
+    # the overlap rule: OVERLAP_NEWEST replaces the stored rows for those days, OVERLAP_OLDEST keeps them and
+    # skips the incoming rows.  Only the overlapping and new rows are written.  Returns the rows appended.
+    #
+    if overlap not in OVERLAP_RULES:
+        raise ValueError(f'{overlap} is not a valid overlap rule.')
+    removed = 0
+    with span('store append') as stage, pd.HDFStore(datastore_path.__str__()) as ds:
+        if key in ds:
+            stored_days: np.ndarray = np.unique(ds.select_column(key, 'Date').dropna()
+                                                .to_numpy(dtype='datetime64[ns]'))
+            incoming: np.ndarray = data_frame['Date'].to_numpy(dtype='datetime64[ns]')
+            if overlap == OVERLAP_OLDEST:
+                data_frame = data_frame[~np.isin(incoming, stored_days)]
+            else:
+                # remove each run of consecutive stored days that the import also covers with one range delete
+                replaced: np.ndarray = np.isin(stored_days, incoming)
+                edges: np.ndarray = np.diff(np.r_[0, replaced.astype('int8'), 0])
+                for start, stop in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+                    first_day = pd.Timestamp(stored_days[start]).to_pydatetime()
+                    last_day = pd.Timestamp(stored_days[stop - 1]).to_pydatetime()
+                    removed += ds.remove(key, where=date_range_where(first_day, last_day))
+        if len(data_frame) > 0:
+            ds.append(key, data_frame, format='table', data_columns=data_columns)
+        stage.rows = len(data_frame)
+    if len(data_frame) > 0:
+        DataStoreCatalog(datastore_path).record(key, kind, data_frame, source, append=True, removed=removed)
+    return len(data_frame)
+
+
+def series_backend(datastore_path: Path, key: str) -> str | None:
+    # the backend keeping a series, None when it isn't stored
+    from data_cruncher.usage_matrix import UsageMatrix, matrix_folder
+
+    if UsageMatrix.exists(matrix_folder(datastore_path), key):
+        return BACKEND_MATRIX
+    if datastore_path.exists():
+        with pd.HDFStore(datastore_path.__str__(), mode='r') as ds:
+            if key in ds:
+                return BACKEND_TABLE
+    return None
+
+
+def check_backend(datastore_path: Path, key: str, backend: str):
+    # raise ValueError when a series is already kept by the other backend, a series is never split between them
+    if backend not in BACKENDS:
+        raise ValueError(f'{backend} is not a valid backend.')
+    stored_backend = series_backend(datastore_path, key)
+    if stored_backend is not None and stored_backend != backend:
+        raise ValueError(f'{key} is stored as a {stored_backend}, it can\'t be appended to as a {backend}.')
+
+
+def check_series(datastore_path: Path, key: str, data_frame: pd.DataFrame):
+    #
+    # raise ValueError when data_frame can't be appended to the stored series table, so an ingest can check
+    # every series before writing to any of them
+    #
+    if not datastore_path.exists():
+        return
+    with pd.HDFStore(datastore_path.__str__(), mode='r') as ds:
+        if key not in ds:
+            return
+        stored_df = ds.select(key, stop=0)
+    if list(stored_df.columns) != list(data_frame.columns) or \
+            [dtype.kind for dtype in stored_df.dtypes] != [dtype.kind for dtype in data_frame.dtypes]:
+        raise ValueError(f'{key} is stored with the columns {", ".join(stored_df.columns)}, it can\'t be '
+                         f'appended to with {", ".join(data_frame.columns)}.')
+
+
+# columns kept by the streaming reader
+USAGE_COLUMNS: list[str] = ['Date', 'Total'] + qtr_hr_fields
+
+
+def usage_chunk_frame(rows: list[tuple], columns: list[str]) -> pd.DataFrame:
+    values: np.ndarray = np.array([row[1:] for row in rows], dtype='float64').reshape(len(rows), len(columns) - 1)
+    chunk_df = pd.DataFrame(values, columns=columns[1:])
+    chunk_df.insert(0, columns[0], pd.to_datetime(pd.Series([row[0] for row in rows], dtype='object')))
+    return chunk_df
+
+
+def iter_usage_chunks(usage_path: Path, from_date: datetime | None = None, to_date: datetime | None = None,
+                      columns: list[str] = None, chunk_size: int = 1000) -> Iterator[pd.DataFrame]:
+    #
+    # read a PPL usage workbook row by row, keeping only the requested columns ('Date' first) of the rows
+    # between from_date and to_date and yielding them as frames of at most chunk_size rows, so memory use
+    # is bounded by the chunk size rather than the size of the workbook
+    #
+    # openpyxl is only needed when streaming
+    from openpyxl import load_workbook
+
+    columns = USAGE_COLUMNS if columns is None else columns
+    workbook = load_workbook(usage_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header: dict[str, int] = {heading: pos for pos, heading in enumerate(next(rows, ()))}
+        missing = [column for column in columns if column not in header]
+        if len(missing) > 0:
+            raise ValueError(f'{usage_path} is missing columns {", ".join(missing)}')
+        date_pos = header[columns[0]]
+        project = itemgetter(*[header[column] for column in columns])
+        chunk: list[tuple] = []
+        for row in rows:
+            date = row[date_pos] if date_pos < len(row) else None
+            if not isinstance(date, datetime):
+                continue
+            if (from_date is not None and date < from_date) or (to_date is not None and date > to_date):
+                continue
+            chunk.append(project(row))
+            if len(chunk) == chunk_size:
+                yield usage_chunk_frame(chunk, columns)
+                chunk = []
+        if len(chunk) > 0:
+            yield usage_chunk_frame(chunk, columns)
+    finally:
+        workbook.close()
+
+
+def read_usage_streaming(usage_path: Path, from_date: datetime | None = None, to_date: datetime | None = None,
+                         columns: list[str] = None) -> pd.DataFrame:
+    columns = USAGE_COLUMNS if columns is None else columns
+    with span('read workbook streaming') as stage:
+        chunks = list(iter_usage_chunks(usage_path, from_date, to_date, columns))
+        usage_df = usage_chunk_frame([], columns) if len(chunks) == 0 else pd.concat(chunks, ignore_index=True)
+        stage.rows = len(usage_df)
+    return usage_df
 
 
 class HourlyUsageData:
-    def __init__(self, from_date: datetime, to_date: datetime, data_frame: pd.DataFrame):
-        self.name = f'Hourly-{from_date.strftime("%m/%d/%Y")}-{to_date.strftime("%m/%d/%Y")}'
+    def __init__(self, from_date: datetime, to_date: datetime, data_frame: pd.DataFrame | None = None,
+                 stats: np.ndarray = None, source: str | None = None,
+                 grid: tuple[np.ndarray, np.ndarray] | None = None):
         self.from_date = from_date
         self.to_date = to_date
-        self.data_frame = data_frame
+        if grid is None:
+            self.data_frame = data_frame
+            self.stats: np.ndarray | None = stats
+        else:
+            self.set_grid(*grid)
+        self.source: str | None = source
+
+    @property
+    def name(self) -> str:
+        return f'Hourly-{self.from_date.strftime("%m/%d/%Y")}-{self.to_date.strftime("%m/%d/%Y")}'
+
+    @property
+    def data_frame(self) -> pd.DataFrame:
+        #
+        # the long format frame, assembled from the actual readings and the aggregate rows on first use and kept
+        # until the frame is replaced.  It is shared by every caller and must not be modified in place.
+        #
+        if self._data_frame is None:
+            self._data_frame = pd.concat([self.actual(), self._aggregate_rows], ignore_index=True)
+        return self._data_frame
+
+    @data_frame.setter
+    def data_frame(self, data_frame: pd.DataFrame):
+        #
+        # split the long format frame once into the actual readings, sorted by interval, and the aggregate
+        # rows, sorted by type then interval, so the accessors below return slices instead of scanning every call
+        #
+        data_frame = compact_long_format(data_frame)
+        codes: np.ndarray = data_frame['type'].cat.codes.to_numpy()
+        actual_df = data_frame[codes == 0]
+        if not actual_df['interval'].is_monotonic_increasing:
+            actual_df = actual_df.sort_values('interval', kind='stable')
+        self._actual: pd.DataFrame | None = actual_df.reset_index(drop=True)
+        self._set_aggregate_rows(data_frame[codes > 0])
+        self._grid: tuple[np.ndarray, np.ndarray] | None = None
+        self._data_frame: pd.DataFrame | None = None
+
+    def set_grid(self, dates: np.ndarray, values: np.ndarray):
+        #
+        # take the readings as a (days x intervals) grid, such as a slice of a memory mapped usage matrix, without
+        # copying it.  The aggregates come from the grid's interval statistics, the long format actual readings
+        # are only assembled if they are asked for.
+        #
+        self.stats = interval_stats(values)
+        self._actual = None
+        self._set_aggregate_rows(grid_long_format(np.empty(0, dtype='datetime64[ns]'),
+                                                  np.empty((0, len(qtr_hr_fields))), self.stats))
+        self._grid = (dates, values)
+        self._data_frame = None
+
+    def _set_aggregate_rows(self, aggregate_df: pd.DataFrame):
+        # sort the aggregate rows by type then interval so min, mean and max are slices of them
+        codes: np.ndarray = aggregate_df['type'].cat.codes.to_numpy()
+        order: np.ndarray = np.lexsort((aggregate_df['interval'].to_numpy(), codes))
+        self._aggregate_rows: pd.DataFrame = aggregate_df.iloc[order].reset_index(drop=True)
+        bounds: np.ndarray = np.searchsorted(codes[order], np.arange(1, len(USAGE_TYPES) + 1))
+        self._min = self._aggregate_rows.iloc[bounds[0]:bounds[1]]
+        self._mean = self._aggregate_rows.iloc[bounds[1]:bounds[2]]
+        self._max = self._aggregate_rows.iloc[bounds[2]:bounds[3]]
+        # one row per interval with its min, mean and max
+        self.aggregates = pd.DataFrame({'interval': self._mean['interval'].to_numpy(),
+                                        'min': self._min['usage'].to_numpy(),
+                                        'mean': self._mean['usage'].to_numpy(),
+                                        'max': self._max['usage'].to_numpy()})
+
+    @property
+    def rows(self) -> int:
+        # rows of the long format frame, counted without assembling it
+        actual_rows = int(self.stats[:, 0].sum()) if self._actual is None else len(self._actual)
+        return actual_rows + len(self._aggregate_rows)
 
     def min(self) -> pd.DataFrame:
-        return self.data_frame[(self.data_frame['type'] == 'min')]
+        return self._min
 
     def mean(self) -> pd.DataFrame:
-        return self.data_frame[self.data_frame['type'] == 'mean']
+        return self._mean
 
     def max(self) -> pd.DataFrame:
-        return self.data_frame[self.data_frame['type'] == 'max']
+        return self._max
 
     def actual(self) -> pd.DataFrame:
-        return self.data_frame[self.data_frame['type'] == 'actual']
+        if self._actual is None:
+            # the grid's readings in long format, the aggregate rows already held are kept
+            actual_df = grid_long_format(*self._grid, self.stats)
+            self._actual = actual_df[actual_df['type'].cat.codes.to_numpy() == 0].reset_index(drop=True)
+        return self._actual
+
+    def interval_stats(self) -> np.ndarray:
+        if self.stats is None:
+            self.stats = interval_stats(to_wide_format(self.actual())[qtr_hr_fields].to_numpy(dtype='float64'))
+        return self.stats
 
     def save(self, datastore_path: Path):
-        ds = pd.HDFStore(datastore_path.__str__())
-        ds[self.name] = self.data_frame
-        ds.close()
+        data_frame = self.data_frame
+        with span('store put', rows=len(data_frame)):
+            ds = pd.HDFStore(datastore_path.__str__())
+            # queryable table format, indexed on Date so from_datastore can read just a date range
+            ds.put(self.name, data_frame, format='table', data_columns=['Date', 'interval'])
+            ds.close()
+        DataStoreCatalog(datastore_path).record(self.name, KIND_HOURLY, data_frame, self.source,
+                                                self.from_date, self.to_date)
+
+    def series_frame(self) -> pd.DataFrame:
+        # the rows the continuous hourly series stores, the actual readings, the aggregates are rebuilt on load
+        return self.actual()
 
-    def merge(self, other):
-        self.data_frame.merg(other.data_frame)
+    def ingest(self, datastore_path: Path, overlap: str = OVERLAP_NEWEST,
+               rollups: 'UsageRollups | None' = None, key: str = HOURLY_SERIES, backend: str = BACKEND_TABLE) -> int:
+        #
+        # add the actual readings to the continuous hourly series, a table in the store or with BACKEND_MATRIX
+        # a usage matrix beside it.  Given the store's rollups, the ingested days are folded into them as well.
+        # Nothing is written when the readings don't fit the stored series.  Returns the rows appended, each
+        # row of a matrix holds a day.
+        #
+        check_backend(datastore_path, key, backend)
+        if backend == BACKEND_MATRIX:
+            from data_cruncher.usage_matrix import UsageMatrix, matrix_folder
+
+            grid_df = to_wide_format(self.actual())
+            with span('matrix write') as stage:
+                appended = UsageMatrix(matrix_folder(datastore_path), key, mode='r+').write(grid_df, overlap)
+                stage.rows = appended
+        else:
+            check_series(datastore_path, key, self.series_frame())
+            grid_df = None if rollups is None else to_wide_format(self.actual())
+            appended = append_series(datastore_path, key, KIND_HOURLY, self.series_frame(), ['Date', 'interval'],
+                                     overlap, self.source)
+        if rollups is not None:
+            with span('rollups update', rows=appended):
+                rollups.update(grid_df, overlap)
+        return appended
+
+    def merge(self, *others: 'HourlyUsageData') -> 'HourlyUsageData':
+        #
+        # combine this and the other frames into one date range, gaps between them are kept and where they
+        # overlap the later argument's readings win.  The day grids are ordered by one sort on date and the
+        # interval aggregates are combined from each frame's statistics rather than recomputed.
+        #
+        frames: list[HourlyUsageData] = [self, *others]
+        for frame in frames:
+            if len(frame.actual()) > 0 and frame.actual()['Date'].isna().all():
+                raise ValueError(f'{frame.name} was saved before readings carried their date and can\'t be merged.')
+        grids: list[pd.DataFrame] = [to_wide_format(frame.actual()) for frame in frames]
+        dates: np.ndarray = np.concatenate([grid['Date'].to_numpy(dtype='datetime64[ns]') for grid in grids])
+        values: np.ndarray = np.vstack([grid[qtr_hr_fields].to_numpy(dtype='float64') for grid in grids])
+        precedence: np.ndarray = np.repeat(np.arange(len(frames)), [len(grid) for grid in grids])
+        order: np.ndarray = np.lexsort((-precedence, dates))
+        dates, values = dates[order], values[order]
+        first: np.ndarray = np.r_[True, dates[1:] != dates[:-1]] if len(dates) > 0 else np.zeros(0, dtype=bool)
+        self.stats = combine_interval_stats([frame.interval_stats() for frame in frames],
+                                            values[~first], values[first])
+        merged_df = pd.DataFrame(values[first], columns=qtr_hr_fields)
+        merged_df.insert(0, 'Date', dates[first])
+        self.from_date = min(frame.from_date for frame in frames)
+        self.to_date = max(frame.to_date for frame in frames)
+        self.data_frame = to_long_format(merged_df, self.stats)
+        return self
 
 
 class DailyUsageData:
-    def __init__(self, from_date: datetime, to_date: datetime, data_frame: pd.DataFrame):
-        self.name = f'Daily-{from_date.strftime("%m/%d/%Y")}-{to_date.strftime("%m/%d/%Y")}'
+    def __init__(self, from_date: datetime, to_date: datetime, data_frame: pd.DataFrame, source: str | None = None):
         self.from_date = from_date
         self.to_date = to_date
         self.data_frame = data_frame[(data_frame['Date'] >= from_date) & (data_frame['Date'] <= to_date)]
+        self.source: str | None = source
+
+    @property
+    def name(self) -> str:
+        return f'Daily-{self.from_date.strftime("%m/%d/%Y")}-{self.to_date.strftime("%m/%d/%Y")}'
 
     def save(self, datastore_path: Path):
-        ds = pd.HDFStore(datastore_path.__str__())
-        ds[self.name] = self.data_frame
-        ds.close()
+        with span('store put', rows=len(self.data_frame)):
+            ds = pd.HDFStore(datastore_path.__str__())
+            # queryable table format, indexed on Date so from_datastore can read just a date range
+            ds.put(self.name, self.data_frame, format='table', data_columns=['Date'])
+            ds.close()
+        DataStoreCatalog(datastore_path).record(self.name, KIND_DAILY, self.data_frame, self.source,
+                                                self.from_date, self.to_date)
+
+    def series_frame(self) -> pd.DataFrame:
+        #
+        # the days in the continuous daily series columns, whatever temperature source was joined.  NWS
+        # spreadsheets name the average temperature column Average, the other sources Avg.
+        #
+        columns: dict[str, np.ndarray] = {'Date': self.data_frame['Date'].to_numpy(dtype='datetime64[ns]')}
+        for column in DAILY_SERIES_COLUMNS[1:]:
+            source_col = 'Average' if column == AVE_TEMP_COL and column not in self.data_frame.columns else column
+            columns[column] = self.data_frame[source_col].to_numpy(dtype='float64') \
+                if source_col in self.data_frame.columns else np.full(len(self.data_frame), np.nan)
+        return pd.DataFrame(columns)
+
+    def ingest(self, datastore_path: Path, overlap: str = OVERLAP_NEWEST, key: str = DAILY_SERIES) -> int:
+        series_df = self.series_frame()
+        check_series(datastore_path, key, series_df)
+        return append_series(datastore_path, key, KIND_DAILY, series_df, ['Date'], overlap, self.source)
 
-    def merge(self, other):
-        self.data_frame.merge(other.data_frame)
+    def merge(self, *others: 'DailyUsageData') -> 'DailyUsageData':
+        # combine this and the other frames into one date range, where they overlap the later argument wins
+        frames: list[DailyUsageData] = [self, *others]
+        merged_df = pd.concat([frame.data_frame for frame in frames], ignore_index=True)
+        precedence: np.ndarray = np.repeat(np.arange(len(frames)), [len(frame.data_frame) for frame in frames])
+        merged_df = merged_df.iloc[np.lexsort((-precedence, merged_df['Date'].to_numpy(dtype='datetime64[ns]')))]
+        self.data_frame = merged_df[~merged_df['Date'].duplicated(keep='first')].reset_index(drop=True)
+        self.from_date = min(frame.from_date for frame in frames)
+        self.to_date = max(frame.to_date for frame in frames)
+        return self
 
 
 class HourlyUsageDataFactory:
     @classmethod
-    def from_spreadsheet(cls, hourly_usage_path: Path, from_date: datetime, to_date: datetime):
-        # Load hourly usage spreadsheet and drop unneeded columns
-        hourly_usage_df: pd.DataFrame = pd.read_excel(hourly_usage_path)
-        hourly_usage_df.drop(columns=['Account Number', 'Meter Number'], inplace=True)
-        # Get from and to dates from the hourly usage data
-        date_range = hourly_usage_df['Date'].agg(['min', 'max'])
-        source_from_date: datetime = datetime(year=date_range['min'].year,
-                                              month=date_range['min'].month,
-                                              day=date_range['min'].day)
-        source_to_date: datetime = datetime(year=date_range['max'].year,
-                                            month=date_range['max'].month,
-                                            day=date_range['max'].day)
-        #
-        # assemble a pivot table with a row for each usage time interval
-        #
-        # create a Series containing the average usage for each time interval
-        agg_df = hourly_usage_df[
-            (hourly_usage_df['Date'] >= from_date) & (hourly_usage_df['Date'] <= to_date)][qtr_hr_fields].agg(['min', 'mean', 'max'])
-        # build lists for actual usage, date and entry type ('mean' or 'actual')
-        usage_data: list[float]= []
-        usage_index: list[datetime] = []
-        usage_type: list[str] = []
-        for idx, field in enumerate(qtr_hr_fields):
-            for usage in hourly_usage_df[field].values:
-                if not isnan(usage):
-                    usage_data.append(usage)
-                    usage_index.append(qtr_hr_times[idx])
-                    usage_type.append('actual')
-            usage_data.append(agg_df[field]['min'])
-            usage_index.append(qtr_hr_times[idx])
-            usage_type.append('min')
-            usage_data.append(agg_df[field]['mean'])
-            usage_index.append(qtr_hr_times[idx])
-            usage_type.append('mean')
-            usage_data.append(agg_df[field]['max'])
-            usage_index.append(qtr_hr_times[idx])
-            usage_type.append('max')
-        # create Series objects for actual usage, date and entry type
-        time_series: pd.Series = pd.Series(data=usage_index, dtype='datetime64[ns]')
-        usage_series: pd.Series = pd.Series(data=usage_data, dtype='float64')
-        type_series: pd.Series = pd.Series(data=usage_type, dtype='object')
-        # create a DataFrame using the Series created above
-        usage_df = pd.DataFrame({'time': time_series, 'usage': usage_series, 'type': type_series})
-        return HourlyUsageData(from_date=from_date, to_date=to_date, data_frame=usage_df)
+    def from_spreadsheet(cls, hourly_usage_path: Path, from_date: datetime, to_date: datetime,
+                         streaming: bool = False):
+        if streaming:
+            # project and filter while reading, only one chunk of raw rows is held at a time
+            hourly_usage_df: pd.DataFrame = read_usage_streaming(hourly_usage_path, from_date, to_date)
+        else:
+            # Load hourly usage spreadsheet and drop unneeded columns
+            with span('read workbook') as stage:
+                hourly_usage_df: pd.DataFrame = workbook_cache.read_excel(hourly_usage_path).drop(
+                    columns=['Account Number', 'Meter Number'])
+                stage.rows = len(hourly_usage_df)
+        return cls.from_frame(hourly_usage_df, from_date, to_date, source=hourly_usage_path.name)
+
+    @classmethod
+    def from_frame(cls, hourly_usage_df: pd.DataFrame, from_date: datetime, to_date: datetime,
+                   source: str | None = None) -> HourlyUsageData:
+        #
+        # assemble a long format table with a row for each usage reading and interval aggregate from the
+        # workbook rows in the date range
+        #
+        with span('hourly reshape') as stage:
+            hourly_usage_df = hourly_usage_df[(hourly_usage_df['Date'] >= from_date) &
+                                              (hourly_usage_df['Date'] <= to_date)]
+            stats = interval_stats(hourly_usage_df[qtr_hr_fields].to_numpy(dtype='float64'))
+            usage_df = to_long_format(hourly_usage_df, stats)
+            stage.rows = len(usage_df)
+        return HourlyUsageData(from_date=from_date, to_date=to_date, data_frame=usage_df, stats=stats,
+                               source=source)
+
+    @classmethod
+    def from_matrix(cls, matrix: 'UsageMatrix', from_date: datetime | None = None,
+                    to_date: datetime | None = None) -> HourlyUsageData:
+        #
+        # the days of the date range as a view of the memory mapped matrix, only the pages of its rows are read.
+        # Without a date range the matrix covers the days it holds.
+        #
+        from_date = pd.Timestamp(matrix.start_date).to_pydatetime() if from_date is None else from_date
+        to_date = pd.Timestamp(matrix.end_date).to_pydatetime() if to_date is None else to_date
+        with span('matrix select') as stage:
+            usage_data = HourlyUsageData(from_date=from_date, to_date=to_date, source=matrix.path.name,
+                                         grid=(matrix.dates(from_date, to_date), matrix.select(from_date, to_date)))
+            stage.rows = usage_data.rows
+        return usage_data
+
+    @classmethod
+    def from_datastore(cls, datastore_path: Path, name: str,
+                       from_date: datetime | None = None, to_date: datetime | None = None) -> HourlyUsageData:
+        from data_cruncher.usage_matrix import UsageMatrix, matrix_folder
+
+        if UsageMatrix.exists(matrix_folder(datastore_path), name):
+            # series ingested into a usage matrix are read from it
+            return cls.from_matrix(UsageMatrix(matrix_folder(datastore_path), name), from_date, to_date)
+        with span('store select') as stage, pd.HDFStore(datastore_path.__str__(), mode='r') as ds:
+            if from_date is None or to_date is None:
+                name_from_date, name_to_date = entry_date_range(datastore_path, ds, HOURLY_NAME_REGEX, name)
+                from_date = name_from_date if from_date is None else from_date
+                to_date = name_to_date if to_date is None else to_date
+            # only the actual readings in the date range are read, the interval aggregates are recomputed for it
+            usage_df = select_range(ds, name, from_date, to_date)
+            stage.rows = len(usage_df)
+        if 'Date' not in usage_df.columns:
+            # saved before readings carried their date, the stored aggregates are kept as they are
+            return HourlyUsageData(from_date=from_date, to_date=to_date, data_frame=usage_df)
+        with span('hourly reshape', rows=len(usage_df)):
+            grid_df = to_wide_format(usage_df)
+            stats = interval_stats(grid_df[qtr_hr_fields].to_numpy(dtype='float64'))
+            usage_df = to_long_format(grid_df, stats)
+        return HourlyUsageData(from_date=from_date, to_date=to_date, data_frame=usage_df, stats=stats)
 
     @classmethod
-    def from_datastore(cls, datastore_path: Path, name: str) -> HourlyUsageData:
-        # extract from and to dates from data store entry name
-        regex = re.compile('Hourly-(\d{2}/\d{2}/\d{4})-(\d{2}/\d{2}/\d{4})')
-        match = regex.match(name)
-        from_date_str = match.groups()[0]
-        to_date_str = match.groups()[1]
-        from_date: datetime = datetime(year=from_date_str[6:],
-                                       month=from_date_str[0:2],
-                                       day=from_date_str[3:5])
-        to_date: datetime = datetime(year=to_date_str[6:],
-                                     month=to_date_str[0:2],
-                                     day=to_date_str[3:5])
-        with pd.HDFStore(datastore_path.__str__()) as ds:
-            usage_df = ds[name]
-        return HourlyUsageData(from_date=from_date, to_date=to_date, data_frame=usage_df)
+    def from_datastore_merged(cls, datastore_path: Path, names: list[str]) -> HourlyUsageData:
+        frames = [cls.from_datastore(datastore_path, name) for name in names]
+        return frames[0].merge(*frames[1:])
 
 
 class DailyUsageDataFactory:
     @classmethod
-    def from_spreadsheet(cls, hourly_usage_path: Path, daily_temp_data: TemperatureData, from_date: datetime, to_date: datetime):
-        # Load hourly usage spreadsheet and drop unneeded columns
-        daily_usage_df: pd.DataFrame = pd.read_excel(hourly_usage_path)
-        drop_fields: list[str] = ['Account Number', 'Meter Number', 'Min', 'Max'] + qtr_hr_fields
-        daily_usage_df.drop(columns=drop_fields, inplace=True)
-        # Get from and to dates from the hourly usage data
-        date_range = daily_usage_df['Date'].agg(['min', 'max'])
-        source_from_date: datetime = datetime(year=date_range['min'].year,
-                                              month=date_range['min'].month,
-                                              day=date_range['min'].day)
-        source_to_date: datetime = datetime(year=date_range['max'].year,
-                                            month=date_range['max'].month,
-                                            day=date_range['max'].day)
-        # Merge daily temp data into the daily usage data
-        usage_and_temp_df = daily_usage_df.merge(how='left',
-                                                 on='Date',
-                                                 right=daily_temp_data.data_frame)
-
-        return DailyUsageData(from_date=from_date, to_date=to_date, data_frame=usage_and_temp_df)
+    def from_spreadsheet(cls, hourly_usage_path: Path, daily_temp_data: 'TemperatureData', from_date: datetime,
+                         to_date: datetime, streaming: bool = False):
+        if streaming:
+            # only the date and daily total are read, and only for rows in the date range
+            daily_usage_df: pd.DataFrame = read_usage_streaming(hourly_usage_path, from_date, to_date,
+                                                                columns=['Date', 'Total'])
+        else:
+            # Load hourly usage spreadsheet and drop unneeded columns
+            drop_fields: list[str] = ['Account Number', 'Meter Number', 'Min', 'Max'] + qtr_hr_fields
+            with span('read workbook') as stage:
+                daily_usage_df: pd.DataFrame = workbook_cache.read_excel(hourly_usage_path).drop(columns=drop_fields)
+                stage.rows = len(daily_usage_df)
+        return cls.from_frame(daily_usage_df, daily_temp_data, from_date, to_date, source=hourly_usage_path.name)
 
     @classmethod
-    def from_datastore(cls, datastore_path: Path, name: str) -> DailyUsageData:
-        # extract from and to dates from data store entry name
-        regex = re.compile('Daily-(\d{2}/\d{2}/\d{4})-(\d{2}/\d{2}/\d{4})')
-        match = regex.match(name)
-        from_date_str = match.groups()[0]
-        to_date_str = match.groups()[1]
-        from_date: datetime = datetime(year=from_date_str[6:],
-                                       month=from_date_str[0:2],
-                                       day=from_date_str[3:5])
-        to_date: datetime = datetime(year=to_date_str[6:],
-                                     month=to_date_str[0:2],
-                                     day=to_date_str[3:5])
-        with pd.HDFStore(datastore_path.__str__()) as ds:
-            usage_df = ds[name]
+    def from_frame(cls, daily_usage_df: pd.DataFrame, daily_temp_data: 'TemperatureData', from_date: datetime,
+                   to_date: datetime, source: str | None = None) -> DailyUsageData:
+        # Join daily temp data onto the daily usage data by date
+        with span('temperature merge', rows=len(daily_usage_df)):
+            usage_and_temp_df = daily_temp_data.join(daily_usage_df)
+
+        return DailyUsageData(from_date=from_date, to_date=to_date, data_frame=usage_and_temp_df, source=source)
+
+    @classmethod
+    def from_datastore(cls, datastore_path: Path, name: str,
+                       from_date: datetime | None = None, to_date: datetime | None = None) -> DailyUsageData:
+        with span('store select') as stage, pd.HDFStore(datastore_path.__str__(), mode='r') as ds:
+            if from_date is None or to_date is None:
+                name_from_date, name_to_date = entry_date_range(datastore_path, ds, DAILY_NAME_REGEX, name)
+                from_date = name_from_date if from_date is None else from_date
+                to_date = name_to_date if to_date is None else to_date
+            usage_df = select_range(ds, name, from_date, to_date)
+            stage.rows = len(usage_df)
         return DailyUsageData(from_date=from_date, to_date=to_date, data_frame=usage_df)
 
+    @classmethod
+    def from_datastore_merged(cls, datastore_path: Path, names: list[str]) -> DailyUsageData:
+        frames = [cls.from_datastore(datastore_path, name) for name in names]
+        return frames[0].merge(*frames[1:])
+
 
 if __name__ == '__main__':
+    from data_cruncher.temperature_data import TemperatureDataFactory
+    import matplotlib.pyplot as plt
+
     usage_path = Path('data/power-usage.xlsx')
-    hourly_usage_data = HourlyUsageDataFactory.from_spreadsheet(hourly_usage_path=usage_path)
+    from_date = datetime(year=2023, month=11, day=1)
+    to_date = datetime(year=2023, month=11, day=30)
+    hourly_usage_data = HourlyUsageDataFactory.from_spreadsheet(hourly_usage_path=usage_path, from_date=from_date,
+                                                                to_date=to_date)
     temp_path = Path('data/temp-data.xlsx')
+    daily_temp_data = TemperatureDataFactory.from_nws_spreadsheet(data_path=temp_path, from_date=from_date,
+                                                                  to_date=to_date)
     daily_usage_data = DailyUsageDataFactory.from_spreadsheet(hourly_usage_path=usage_path,
-                                                              daily_temp_path=temp_path,
-                                                              from_date=datetime(year=2023, month=11, day=1),
-                                                              to_date=datetime(year=2023, month=11, day=30))
+                                                              daily_temp_data=daily_temp_data,
+                                                              from_date=from_date,
+                                                              to_date=to_date)
     daily_usage_data.data_frame.plot.line(x='Date', y='Total')
     plt.show()
     #datastore_path = Path('data/test_data.h5')
@@ -0,0 +1,151 @@
+from datetime import datetime
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_cruncher.usage_data import OVERLAP_NEWEST, OVERLAP_OLDEST, OVERLAP_RULES, qtr_hr_fields
+
+MATRIX_SUFFIX = '.usage'
+INDEX_SUFFIX = '.usage.json'
+MATRIX_DTYPE = np.dtype('<f4')
+# the matrices of a data store's series are kept in a folder beside it
+FOLDER_SUFFIX = '.matrices'
+
+
+def to_day(date: datetime | np.datetime64 | pd.Timestamp) -> np.datetime64:
+    return np.datetime64(pd.Timestamp(date).normalize().to_datetime64(), 'D')
+
+
+def matrix_folder(datastore_path: Path) -> Path:
+    return datastore_path.with_name(datastore_path.name + FOLDER_SUFFIX)
+
+
+class UsageMatrix:
+    #
+    # one meter's usage as a (days x 96 intervals) float32 grid in a raw file that is memory mapped, never read
+    # whole.  Row n holds the day n days after the start date, so the rows of a date range are found by
+    # subtraction and selected as a slice of the map without copying.  Readings missing from the exports, and
+    # days never written, are NaN.  The start date and day count are kept in a small JSON index beside it.
+    #
+    def __init__(self, folder: Path, name: str, mode: str = 'r'):
+        if mode not in ['r', 'r+']:
+            raise ValueError(f'{mode} is not a valid usage matrix mode.')
+        self.path: Path = folder.joinpath(name + MATRIX_SUFFIX)
+        self.index_path: Path = folder.joinpath(name + INDEX_SUFFIX)
+        self.mode: str = mode
+        self.start_date: np.datetime64 | None = None
+        self.days: int = 0
+        self._data: np.ndarray = np.empty((0, len(qtr_hr_fields)), dtype=MATRIX_DTYPE)
+        if self.index_path.exists():
+            with self.index_path.open(mode='r') as f:
+                index = json.load(f)
+            self.start_date = np.datetime64(index['start_date'], 'D')
+            self.days = index['days']
+            self._map()
+        elif mode == 'r':
+            raise FileNotFoundError(f'{self.index_path} does not exist.')
+        else:
+            folder.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def exists(folder: Path, name: str) -> bool:
+        return folder.joinpath(name + INDEX_SUFFIX).exists()
+
+    @property
+    def end_date(self) -> np.datetime64 | None:
+        return None if self.start_date is None else self.start_date + (self.days - 1)
+
+    def rows(self, from_date: datetime | None = None, to_date: datetime | None = None) -> slice:
+        # the rows holding the days from from_date through to_date, clipped to the days stored
+        if self.start_date is None:
+            return slice(0, 0)
+        start = 0 if from_date is None else int((to_day(from_date) - self.start_date).astype('int64'))
+        stop = self.days if to_date is None else int((to_day(to_date) - self.start_date).astype('int64')) + 1
+        return slice(min(max(start, 0), self.days), min(max(stop, 0), self.days))
+
+    def select(self, from_date: datetime | None = None, to_date: datetime | None = None,
+               intervals: slice = slice(None)) -> np.ndarray:
+        # a view of the days and intervals, reading only the pages touched when the values are used
+        return self._data[self.rows(from_date, to_date), intervals]
+
+    def dates(self, from_date: datetime | None = None, to_date: datetime | None = None) -> np.ndarray:
+        # the day of each row select returns for the same range
+        rows = self.rows(from_date, to_date)
+        if self.start_date is None:
+            return np.empty(0, dtype='datetime64[D]')
+        return self.start_date + np.arange(rows.start, rows.stop)
+
+    def valid(self, from_date: datetime | None = None, to_date: datetime | None = None,
+              intervals: slice = slice(None)) -> np.ndarray:
+        return ~np.isnan(self.select(from_date, to_date, intervals))
+
+    def frame(self, from_date: datetime | None = None, to_date: datetime | None = None) -> pd.DataFrame:
+        # the days as a (Date + qtr_hr_fields) grid, the layout the usage factories read, skipping empty days
+        values: np.ndarray = self.select(from_date, to_date)
+        present: np.ndarray = ~np.isnan(values).all(axis=1)
+        grid_df = pd.DataFrame(values[present].astype('float64'), columns=qtr_hr_fields)
+        grid_df.insert(0, 'Date', self.dates(from_date, to_date)[present].astype('datetime64[ns]'))
+        return grid_df
+
+    def write(self, grid_df: pd.DataFrame, overlap: str = OVERLAP_NEWEST) -> int:
+        #
+        # store the days of a (Date + qtr_hr_fields) grid, growing the file to cover them.  Days already stored
+        # are replaced with OVERLAP_NEWEST and kept with OVERLAP_OLDEST.  Returns the days written.
+        #
+        if self.mode != 'r+':
+            raise PermissionError(f'{self.path} is open read only.')
+        if overlap not in OVERLAP_RULES:
+            raise ValueError(f'{overlap} is not a valid overlap rule.')
+        if len(grid_df) == 0:
+            return 0
+        dates: np.ndarray = grid_df['Date'].to_numpy(dtype='datetime64[D]')
+        values: np.ndarray = grid_df[qtr_hr_fields].to_numpy(dtype=MATRIX_DTYPE)
+        self._extend(dates.min(), dates.max())
+        rows: np.ndarray = (dates - self.start_date).astype('int64')
+        if overlap == OVERLAP_OLDEST:
+            empty: np.ndarray = np.isnan(self._data[rows]).all(axis=1)
+            rows, values = rows[empty], values[empty]
+        self._data[rows] = values
+        self._data.flush()
+        return len(rows)
+
+    def _extend(self, first_date: np.datetime64, last_date: np.datetime64):
+        # grow the file to cover first_date through last_date, new rows start out NaN
+        if self.start_date is None:
+            self.start_date = first_date
+        leading = max(int((self.start_date - first_date).astype('int64')), 0)
+        days = max(self.days + leading, int((last_date - self.start_date).astype('int64')) + 1 + leading)
+        if leading == 0 and days == self.days:
+            return
+        if leading > 0:
+            # days before the start shift every row, rewrite the file with the stored rows moved down
+            temp_path = self.path.with_name(self.path.name + '.tmp')
+            grown: np.ndarray = np.memmap(temp_path, dtype=MATRIX_DTYPE, mode='w+',
+                                          shape=(days, len(qtr_hr_fields)))
+            grown[:] = np.nan
+            grown[leading:leading + self.days] = self._data
+            grown.flush()
+            del grown
+            self._data = np.empty((0, len(qtr_hr_fields)), dtype=MATRIX_DTYPE)
+            temp_path.replace(self.path)
+            self.start_date = first_date
+        else:
+            with self.path.open(mode='ab') as f:
+                f.write(np.full((days - self.days, len(qtr_hr_fields)), np.nan, dtype=MATRIX_DTYPE).tobytes())
+        self.days = days
+        self._save_index()
+        self._map()
+
+    def _map(self):
+        if self.days > 0:
+            self._data = np.memmap(self.path, dtype=MATRIX_DTYPE, mode=self.mode,
+                                   shape=(self.days, len(qtr_hr_fields)))
+
+    def _save_index(self):
+        temp_path = self.index_path.with_name(self.index_path.name + '.tmp')
+        with temp_path.open(mode='w') as f:
+            json.dump({'start_date': str(self.start_date), 'days': self.days, 'intervals': len(qtr_hr_fields),
+                       'dtype': MATRIX_DTYPE.str}, f, indent=2)
+        temp_path.replace(self.index_path)
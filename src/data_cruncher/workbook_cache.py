@@ -0,0 +1,92 @@
+from collections import OrderedDict
+from importlib.util import find_spec
+from pathlib import Path
+from threading import Lock
+
+import pandas as pd
+
+# feather sidecars need pyarrow, without it no sidecars are kept.  pyarrow is only looked up here, pandas
+# imports it when a sidecar is first read or written.
+SIDECAR_SUFFIX = '.feather'
+SIDECARS_AVAILABLE: bool = find_spec('pyarrow') is not None
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class WorkbookCache:
+    #
+    # cache of parsed workbooks keyed by (resolved path, size, mtime), so that a workbook is parsed once
+    # no matter how many factories read it.  Cached frames are shared and must not be modified in place.
+    #
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, sidecar: bool = False):
+        self.max_bytes: int = max_bytes
+        self.sidecar: bool = sidecar and SIDECARS_AVAILABLE
+        self.used_bytes: int = 0
+        self._frames: OrderedDict[tuple[str, int, int], tuple[pd.DataFrame, int]] = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def key(path: Path) -> tuple[str, int, int]:
+        stat = path.stat()
+        return path.resolve().__str__(), stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def sidecar_path(path: Path, key: tuple[str, int, int]) -> Path:
+        return path.with_name(f'.{path.name}.{key[1]}-{key[2]}{SIDECAR_SUFFIX}')
+
+    def read_excel(self, path: Path) -> pd.DataFrame:
+        key = self.key(path)
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                return self._frames[key][0]
+        data_frame = self._read_sidecar(path, key) if self.sidecar else None
+        if data_frame is None:
+            data_frame = pd.read_excel(path)
+            if self.sidecar:
+                self._write_sidecar(path, key, data_frame)
+        self._insert(key, data_frame)
+        return data_frame
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.used_bytes = 0
+
+    def _insert(self, key: tuple[str, int, int], data_frame: pd.DataFrame):
+        size = int(data_frame.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            # drop entries for earlier versions of the same workbook
+            for stale_key in [k for k in self._frames if k[0] == key[0]]:
+                self.used_bytes -= self._frames.pop(stale_key)[1]
+            if size > self.max_bytes:
+                return
+            while self._frames and self.used_bytes + size > self.max_bytes:
+                self.used_bytes -= self._frames.popitem(last=False)[1][1]
+            self._frames[key] = (data_frame, size)
+            self.used_bytes += size
+
+    @staticmethod
+    def _read_sidecar(path: Path, key: tuple[str, int, int]) -> pd.DataFrame | None:
+        sidecar_path = WorkbookCache.sidecar_path(path, key)
+        if not sidecar_path.exists():
+            return None
+        try:
+            return pd.read_feather(sidecar_path)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_sidecar(path: Path, key: tuple[str, int, int], data_frame: pd.DataFrame):
+        sidecar_path = WorkbookCache.sidecar_path(path, key)
+        try:
+            for old_path in path.parent.glob(f'.{path.name}.*{SIDECAR_SUFFIX}'):
+                old_path.unlink()
+            data_frame.to_feather(sidecar_path)
+        except OSError:
+            # a read only input folder just means no sidecar
+            pass
+
+
+# shared by the daily and hourly usage factories
+workbook_cache = WorkbookCache()
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+import sqlite3
+
+DATE_FORMAT = '%Y-%m-%d'
+# days fetched within this many days of their date may still be forecasts or partial observations
+DEFAULT_RECENT_DAYS = 3
+# and are fetched again once they are this old
+DEFAULT_RECENT_TTL = timedelta(hours=12)
+# missing ranges separated by this many cached days or fewer are fetched as one request
+DEFAULT_MERGE_GAP = 3
+
+
+class TemperatureCache:
+    #
+    # on disk cache of daily temperatures keyed by (latitude, longitude, date), so repeated requests only
+    # fetch the days that are not cached yet or whose cached values may since have changed
+    #
+    def __init__(self, cache_path: Path, recent_days: int = DEFAULT_RECENT_DAYS,
+                 recent_ttl: timedelta = DEFAULT_RECENT_TTL, merge_gap: int = DEFAULT_MERGE_GAP):
+        self.cache_path: Path = cache_path
+        self.recent_days: int = recent_days
+        self.recent_ttl: timedelta = recent_ttl
+        self.merge_gap: int = merge_gap
+        self.connection = sqlite3.connect(cache_path.__str__(), check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS temps ('
+                                'latitude REAL, longitude REAL, date TEXT, '
+                                'tempmin REAL, tempmax REAL, temp REAL, fetched_at TEXT, '
+                                'PRIMARY KEY (latitude, longitude, date))')
+        self.connection.commit()
+
+    @staticmethod
+    def location(latitude: float, longitude: float) -> tuple[float, float]:
+        # about 10 m of precision, so float noise in the settings doesn't split the cache
+        return round(float(latitude), 4), round(float(longitude), 4)
+
+    def days(self, latitude: float, longitude: float, from_date: datetime, to_date: datetime) -> list[dict]:
+        # cached days in the range, in the shape of Visual Crossing's daily entries
+        rows = self.connection.execute('SELECT date, tempmin, tempmax, temp FROM temps '
+                                       'WHERE latitude = ? AND longitude = ? AND date BETWEEN ? AND ? ORDER BY date',
+                                       (*self.location(latitude, longitude),
+                                        from_date.strftime(DATE_FORMAT), to_date.strftime(DATE_FORMAT)))
+        return [{'datetime': row[0], 'tempmin': row[1], 'tempmax': row[2], 'temp': row[3]} for row in rows]
+
+    def missing_ranges(self, latitude: float, longitude: float, from_date: datetime, to_date: datetime,
+                       now: datetime | None = None) -> list[tuple[datetime, datetime]]:
+        #
+        # date ranges that have to be fetched to cover from_date to to_date: days that are not cached, and
+        # recent days whose cached values are older than recent_ttl.  Ranges separated by no more than
+        # merge_gap cached days are coalesced into one request.
+        #
+        now = datetime.now() if now is None else now
+        fresh: set[str] = set()
+        rows = self.connection.execute('SELECT date, fetched_at FROM temps '
+                                       'WHERE latitude = ? AND longitude = ? AND date BETWEEN ? AND ?',
+                                       (*self.location(latitude, longitude),
+                                        from_date.strftime(DATE_FORMAT), to_date.strftime(DATE_FORMAT)))
+        for date_str, fetched_at_str in rows:
+            fetched_at = datetime.fromisoformat(fetched_at_str)
+            settled = fetched_at - datetime.strptime(date_str, DATE_FORMAT) >= timedelta(days=self.recent_days)
+            if settled or now - fetched_at < self.recent_ttl:
+                fresh.add(date_str)
+        ranges: list[tuple[datetime, datetime]] = []
+        date = datetime(year=from_date.year, month=from_date.month, day=from_date.day)
+        while date <= to_date:
+            if date.strftime(DATE_FORMAT) not in fresh:
+                if len(ranges) > 0 and (date - ranges[-1][1]).days <= self.merge_gap + 1:
+                    ranges[-1] = (ranges[-1][0], date)
+                else:
+                    ranges.append((date, date))
+            date = date + timedelta(days=1)
+        return ranges
+
+    def put(self, latitude: float, longitude: float, days: list[dict], fetched_at: datetime | None = None):
+        fetched_at = datetime.now() if fetched_at is None else fetched_at
+        location = self.location(latitude, longitude)
+        self.connection.executemany('INSERT OR REPLACE INTO temps VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                    [(*location, day['datetime'], day['tempmin'], day['tempmax'], day['temp'],
+                                      fetched_at.isoformat()) for day in days])
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
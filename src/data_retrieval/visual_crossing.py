@@ -0,0 +1,146 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+import json
+from threading import local, Lock
+from time import monotonic, sleep
+from urllib.parse import urlparse
+
+VISUAL_CROSSING_URL = 'https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline'
+DEFAULT_CHUNK_DAYS = 90
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BACKOFF = 0.5
+DEFAULT_REQUESTS_PER_SECOND = 4.0
+DEFAULT_TIMEOUT = 30.0
+# responses worth another try, any other response outside the 2xx range is a hard failure
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def visual_crossing_url(base_url: str, latitude: float, longitude: float, from_date: datetime, to_date: datetime,
+                        passkey: str) -> str:
+    return f"{base_url}/{latitude},{longitude}/{from_date.strftime('%Y-%m-%d')}/{to_date.strftime('%Y-%m-%d')}" \
+        f"?key={passkey}&include=days&elements=datetime,tempmax,tempmin,temp"
+
+
+def split_range(from_date: datetime, to_date: datetime, chunk_days: int) -> list[tuple[datetime, datetime]]:
+    chunks: list[tuple[datetime, datetime]] = []
+    while from_date <= to_date:
+        chunk_to = min(from_date + timedelta(days=chunk_days - 1), to_date)
+        chunks.append((from_date, chunk_to))
+        from_date = chunk_to + timedelta(days=1)
+    return chunks
+
+
+class RateLimiter:
+    # spaces requests from all threads at least 1 / requests_per_second apart
+    def __init__(self, requests_per_second: float):
+        self.interval: float = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next: float = 0.0
+        self._lock = Lock()
+
+    def wait(self):
+        with self._lock:
+            now = monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            sleep(start - now)
+
+
+class VisualCrossingClient:
+    #
+    # fetches Visual Crossing daily temperatures, splitting long ranges into chunks that are requested
+    # concurrently over one persistent connection per worker thread, with rate limiting and retries with
+    # exponential backoff for dropped connections and throttled or failed responses.  The worker threads, and
+    # so their connections, are kept for the life of the client until it is closed.
+    #
+    def __init__(self, passkey: str, base_url: str = VISUAL_CROSSING_URL, chunk_days: int = DEFAULT_CHUNK_DAYS,
+                 max_workers: int = DEFAULT_MAX_WORKERS, max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff: float = DEFAULT_BACKOFF, requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+                 timeout: float = DEFAULT_TIMEOUT):
+        self.passkey: str = passkey
+        self.base_url: str = base_url
+        self.chunk_days: int = chunk_days
+        self.max_workers: int = max_workers
+        self.max_retries: int = max_retries
+        self.backoff: float = backoff
+        self.timeout: float = timeout
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self._url_parts = urlparse(base_url)
+        self._local = local()
+        self._connections: list[HTTPConnection] = []
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def fetch_range(self, latitude: float, longitude: float, from_date: datetime, to_date: datetime) -> list[dict]:
+        return self.fetch_ranges(latitude, longitude, [(from_date, to_date)])
+
+    def fetch_ranges(self, latitude: float, longitude: float,
+                     ranges: list[tuple[datetime, datetime]]) -> list[dict]:
+        # daily entries for all the ranges, in range order, each range fetched in concurrent chunks
+        chunks = [chunk for from_date, to_date in ranges for chunk in split_range(from_date, to_date, self.chunk_days)]
+        if len(chunks) == 0:
+            return []
+        results = self._pool().map(lambda chunk: self.fetch_chunk(latitude, longitude, *chunk), chunks)
+        return [day for days in results for day in days]
+
+    def fetch_chunk(self, latitude: float, longitude: float, from_date: datetime, to_date: datetime) -> list[dict]:
+        url = urlparse(visual_crossing_url(self.base_url, latitude, longitude, from_date, to_date, self.passkey))
+        payload = json.loads(self._get(f'{url.path}?{url.query}'))
+        return payload['days']
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            connections, self._connections = self._connections, []
+        if executor is not None:
+            executor.shutdown(wait=True)
+        for connection in connections:
+            connection.close()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='visual-crossing')
+            return self._executor
+
+    def _connection(self) -> HTTPConnection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection_class = HTTPSConnection if self._url_parts.scheme == 'https' else HTTPConnection
+            connection = connection_class(self._url_parts.netloc, timeout=self.timeout)
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _get(self, path: str) -> bytes:
+        for attempt in range(self.max_retries + 1):
+            delay = self.backoff * 2 ** attempt
+            self.rate_limiter.wait()
+            connection = self._connection()
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                body = response.read()
+            except (HTTPException, OSError):
+                # the server dropped the kept alive connection or the network hiccuped, reconnect and retry
+                connection.close()
+            else:
+                if 200 <= response.status < 300:
+                    return body
+                if response.status not in RETRY_STATUSES:
+                    raise ValueError(f'{self._url_parts.netloc} responded {response.status} {response.reason}.')
+                retry_after = response.getheader('Retry-After')
+                if retry_after is not None and retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+            if attempt < self.max_retries:
+                sleep(delay)
+        raise ConnectionError(f'{self._url_parts.netloc} did not respond after {self.max_retries + 1} attempts.')
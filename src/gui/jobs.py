@@ -0,0 +1,122 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from queue import Empty, SimpleQueue
+from threading import Event
+from time import perf_counter
+from typing import Any, Callable, NamedTuple
+
+JOB_PROGRESS = 'progress'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+# how often the event loop looks for job events while jobs are running, in milliseconds
+POLL_MS = 100
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobEvent(NamedTuple):
+    job: 'Job'
+    kind: str
+    message: str
+    elapsed: float
+    result: Any = None
+
+
+class Job:
+    #
+    # handed to the job function as its first argument: report progress with progress() and call check()
+    # between steps so a cancel request stops the job at the next step
+    #
+    def __init__(self, name: str, events: SimpleQueue, on_done: Callable[[Any], None] | None = None):
+        self.name: str = name
+        self.on_done: Callable[[Any], None] | None = on_done
+        self.cancel_event = Event()
+        self.start: float = perf_counter()
+        self._events: SimpleQueue = events
+
+    @property
+    def elapsed(self) -> float:
+        return perf_counter() - self.start
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def check(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled(self.name)
+
+    def progress(self, message: str):
+        self.check()
+        self._events.put(JobEvent(self, JOB_PROGRESS, message, self.elapsed))
+
+
+class JobRunner:
+    #
+    # runs data operations on worker threads so the window's event loop never waits on them.  Workers only
+    # post events to a queue, the event loop drains it with poll() and delivers each finished job's result
+    # to its on_done callback on the event loop's own thread.
+    #
+    def __init__(self, max_workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._events: SimpleQueue = SimpleQueue()
+        self.jobs: list[Job] = []
+
+    @property
+    def busy(self) -> bool:
+        return len(self.jobs) > 0
+
+    def submit(self, name: str, func: Callable[..., Any], *args, on_done: Callable[[Any], None] | None = None,
+               **kwargs) -> Job:
+        job = Job(name, self._events, on_done)
+        self.jobs.append(job)
+        future: Future = self._executor.submit(self._run, job, func, *args, **kwargs)
+        future.add_done_callback(lambda done: self._finished(job, done))
+        return job
+
+    def cancel(self):
+        for job in self.jobs:
+            job.cancel()
+
+    def poll(self) -> list[JobEvent]:
+        # the events posted since the last poll, without waiting for more
+        events: list[JobEvent] = []
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except Empty:
+                break
+            if event.kind != JOB_PROGRESS:
+                self.jobs.remove(event.job)
+                if event.kind == JOB_DONE and event.job.on_done is not None:
+                    event.job.on_done(event.result)
+            events.append(event)
+        return events
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def _run(job: Job, func: Callable[..., Any], *args, **kwargs) -> Any:
+        # timed from when a worker picks the job up, not from when it was queued
+        job.start = perf_counter()
+        return func(job, *args, **kwargs)
+
+    def _finished(self, job: Job, future: Future):
+        # runs on the worker thread
+        if future.cancelled():
+            self._events.put(JobEvent(job, JOB_CANCELLED, f'{job.name} cancelled.', job.elapsed))
+            return
+        error = future.exception()
+        if isinstance(error, JobCancelled):
+            self._events.put(JobEvent(job, JOB_CANCELLED, f'{job.name} cancelled.', job.elapsed))
+        elif error is not None:
+            self._events.put(JobEvent(job, JOB_FAILED, f'{job.name} failed: {error}', job.elapsed))
+        else:
+            self._events.put(JobEvent(job, JOB_DONE, f'{job.name} finished.', job.elapsed, future.result()))
@@ -1,15 +1,25 @@
 import os
 from pathlib import Path
+from queue import Empty, SimpleQueue
 
 import PySimpleGUIQt as sg
 
-from gui.settings_gui import SettingsGUI
-from settings.settings import load_settings, save_settings, Settings
+from data_cruncher.catalog import DataStoreCatalog, KIND_DAILY, KIND_HOURLY
+from data_cruncher.tracing import tracer, SpanRecord
+from gui.jobs import Job, JobRunner, JOB_PROGRESS, POLL_MS
+from gui.selection import MergeSelectionGUI
+
+#
+# the settings and data modules, and pandas and numpy behind them, are imported by the handlers that use them
+# so the main window opens without loading them
+#
 
 
 APP_FOLDER = 'APP_FOLDER'
 SETTINGS = "Settings"
 EXIT = 'Exit'
+CANCEL_JOBS = 'Cancel Jobs'
+TRACE_STAGES = 'Trace Stages'
 CREATE_DS = 'Create Data Store'
 DELETE_DS = 'Delete Data Stores'
 SELECT_DS = 'Select Data Store'
@@ -20,13 +30,29 @@ DAILY_USAGE = 'Daily Usage'
 HOURLY_USAGE = 'Hourly Usage'
 
 OUTPUT_KEY = 'Output'
+# lines kept in the output pane
+OUTPUT_LINES = 200
+# written to the app folder when stage tracing is turned off
+TRACE_FILE = 'stage-trace.json'
+
+
+def merge_frames(job: Job, data_store_path: Path, merges: list[tuple[type, list[str]]]) -> list[str]:
+    # runs on a job thread, each merge is a step that can be cancelled
+    messages: list[str] = []
+    for factory, merge_names in merges:
+        job.progress(f'Merging {len(merge_names)} data frames.')
+        merged = factory.from_datastore_merged(data_store_path, merge_names)
+        job.check()
+        merged.save(data_store_path)
+        messages.append(f'{len(merge_names)} data frames merged into {merged.name}.')
+    return messages
 
 
 class MainGUI:
 
     def __init__(self):
         self.app_folder: Path = Path(os.environ.get(APP_FOLDER))
-        menu_def = [['Misc', [SETTINGS, EXIT]],
+        menu_def = [['Misc', [SETTINGS, CANCEL_JOBS, TRACE_STAGES, EXIT]],
                     ['Data Stores', [CREATE_DS, DELETE_DS, SELECT_DS]],
                     ['Data Frames', [CREATE_DF, MERGE_DF, DELETE_DF]],
                     ['Charts', [DAILY_USAGE, HOURLY_USAGE]]]
@@ -35,8 +61,33 @@ class MainGUI:
         self.window = sg.Window("Home Power Usage", layout, default_element_size=(12, 1), auto_size_text=False,
                                 auto_size_buttons=False,
                                 default_button_element_size=(12, 1))
+        # one worker, so jobs writing to a data store never overlap
+        self.jobs = JobRunner(max_workers=1)
+        self.output_lines: list[str] = []
+        # stages finish on job threads, their spans wait here for the GUI thread to show them
+        self.spans: SimpleQueue[SpanRecord] = SimpleQueue()
+        tracer.add_listener(self.spans.put)
+
+    def output(self, message: str):
+        self.output_lines = (self.output_lines + message.split('\n'))[-OUTPUT_LINES:]
+        self.window.Element(OUTPUT_KEY).update('\n'.join(self.output_lines))
+
+    def trace_stages(self):
+        if tracer.enabled:
+            tracer.disable()
+            self.span_events()
+            trace_path = self.app_folder.joinpath(TRACE_FILE)
+            tracer.write(trace_path)
+            self.output(f'Stage tracing stopped, trace written to {trace_path}.')
+        else:
+            tracer.clear()
+            tracer.enable()
+            self.output('Stage tracing started.')
 
     def settings(self):
+        from gui.settings_gui import SettingsGUI
+        from settings.settings import load_settings, save_settings, Settings
+
         settings_path: Path = Path(self.app_folder, 'settings.yaml')
         settings: Settings = load_settings(settings_path)
         w = SettingsGUI(settings=settings, app_folder=self.app_folder)
@@ -57,7 +108,32 @@ class MainGUI:
         self.window.Element(OUTPUT_KEY).update(f'{CREATE_DF} selected.')
 
     def merge_data_frame(self):
-        self.window.Element(OUTPUT_KEY).update(f'{MERGE_DF} selected.')
+        from data_cruncher.usage_data import DailyUsageDataFactory, HourlyUsageDataFactory
+        from settings.settings import load_settings, Settings
+
+        settings: Settings = load_settings(Path(self.app_folder, 'settings.yaml'))
+        data_store_fn = sg.popup_get_file('Data Store:', initial_folder=settings.data_store_folder,
+                                          file_types=(('HD5', '*.hd5'),))
+        if data_store_fn is None or len(data_store_fn) == 0:
+            return
+        data_store_path = Path(data_store_fn)
+        catalog = DataStoreCatalog(data_store_path)
+        if not catalog.exists():
+            catalog.rebuild()
+        daily_names = catalog.keys(kind=KIND_DAILY, pattern=settings.daily_dataframe_filter)
+        hourly_names = catalog.keys(kind=KIND_HOURLY, pattern=settings.hourly_dataframe_filter)
+        selected = MergeSelectionGUI(MERGE_DF, daily_names + hourly_names).read()
+        merges: list[tuple[type, list[str]]] = []
+        for kind_names, factory in ((daily_names, DailyUsageDataFactory), (hourly_names, HourlyUsageDataFactory)):
+            merge_names = [name for name in selected if name in kind_names]
+            if len(merge_names) > 1:
+                merges.append((factory, merge_names))
+        if len(merges) == 0:
+            self.output(f'{MERGE_DF}: select at least two daily or two hourly data frames.')
+            return
+        self.jobs.submit(MERGE_DF, merge_frames, data_store_path, merges,
+                         on_done=lambda messages: self.output('\n'.join(messages)))
+        self.output(f'{MERGE_DF} started.')
 
     def delete_data_frame(self):
         self.window.Element(OUTPUT_KEY).update(f'{DELETE_DF} selected.')
@@ -68,11 +144,36 @@ class MainGUI:
     def hourly_usage_chart(self):
         self.window.Element(OUTPUT_KEY).update(f'{HOURLY_USAGE} selected.')
 
+    def job_events(self):
+        for job_event in self.jobs.poll():
+            if job_event.kind == JOB_PROGRESS:
+                self.output(f'{job_event.job.name}: {job_event.message} ({job_event.elapsed:.1f}s)')
+            else:
+                self.output(f'{job_event.message} ({job_event.elapsed:.1f}s)')
+        self.span_events()
+
+    def span_events(self):
+        while True:
+            try:
+                self.output(self.spans.get_nowait().describe())
+            except Empty:
+                return
+
     def read(self) -> bool:
-        event, values = self.window.read()
-        if event == SETTINGS:
+        # wake up regularly only while jobs are running, to show their progress and deliver their results
+        event, values = self.window.read(timeout=POLL_MS if self.jobs.busy else None)
+        if event == sg.TIMEOUT_KEY:
+            self.job_events()
+        elif event == SETTINGS:
             self.settings()
+        elif event == TRACE_STAGES:
+            self.trace_stages()
+        elif event == CANCEL_JOBS:
+            self.jobs.cancel()
+            self.output('Cancelling running jobs.')
         elif event in [sg.WIN_CLOSED, EXIT]:
+            self.jobs.shutdown()
+            tracer.remove_listener(self.spans.put)
             return True
         elif event == CREATE_DS:
             self.create_data_store()
@@ -92,6 +193,8 @@ class MainGUI:
             self.hourly_usage_chart()
         else:
             self.window.Element(OUTPUT_KEY).update(f'{event} is not a valid event')
+        # stages run by the handlers on this thread
+        self.span_events()
 
 
 if __name__ == '__main__':
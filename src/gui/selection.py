@@ -1,26 +1,30 @@
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import pandas as pd
 import PySimpleGUIQt as sg
 
+from data_cruncher.catalog import DataStoreCatalog
+
+if TYPE_CHECKING:
+    import pandas as pd
+
 DATA_STORE_FN = 'Data Store File Name'
 DATA_FRAME_LIST = 'Data Frame List'
 CANCEL = 'Cancel'
 SELECT_DS = 'Select DS'
 SELECT_DF = 'Select DF'
+MERGE = 'Merge'
 
 
 class SelectionGUI:
     def __init__(self, title: str, data_store_dir: Path, data_store_file: Path = None):
         self.data_frame_names: list[str] = []
-        self.data_store: [pd.HDFStore, None] = None
-        self.data_frame: [pd.DataFrame, None] = None
+        self.data_store: ['pd.HDFStore', None] = None
+        self.data_frame: ['pd.DataFrame', None] = None
         data_store_fn = ' '
         if data_store_file is not None and data_store_file.exists():
             data_store_fn = data_store_file.__str__()
-            self.data_store = pd.HDFStore(data_store_file.__str__())
-            self.data_frame_names = self.data_store.keys()
-            self.data_store.close()
+            self.data_frame_names = self.catalog_names(data_store_file)
         layout = [
             [sg.Text(text='Data Store:'),
              sg.InputText(default_text=data_store_fn, key=DATA_STORE_FN, size_px=(600, 30)),
@@ -37,22 +41,55 @@ class SelectionGUI:
                                 auto_size_buttons=False,
                                 default_button_element_size=(12, 1))
 
-    def read(self) -> tuple[pd.HDFStore | None, pd.DataFrame | None]:
+    @staticmethod
+    def catalog_names(data_store_file: Path) -> list[str]:
+        # list the data frames from the store's catalog, stores without one are catalogued once
+        catalog = DataStoreCatalog(data_store_file)
+        if not catalog.exists():
+            catalog.rebuild()
+        return catalog.keys()
+
+    def read(self) -> tuple['pd.HDFStore | None', 'pd.DataFrame | None']:
         while True:
             event, values = self.window.read()
             if event == CANCEL:
                 return None, None
             elif event == SELECT_DS:
-                data_store_fn = values[DATA_STORE_FN]
-                self.data_store = pd.HDFStore(data_store_fn)
-                self.data_frame_names = self.data_store.keys()
+                self.data_frame_names = self.catalog_names(Path(values[DATA_STORE_FN]))
                 self.window.Element(DATA_FRAME_LIST).Update(self.data_frame_names)
             elif event == SELECT_DF:
-                if self.data_store is not None:
-                    if values[DATA_FRAME_LIST][0] in self.data_store.keys():
-                        self.data_frame = self.data_store[values[DATA_FRAME_LIST][0]]
-                        self.data_store.close()
-                        return self.data_store, self.data_frame
+                if len(values[DATA_FRAME_LIST]) > 0 and values[DATA_FRAME_LIST][0] in self.data_frame_names:
+                    import pandas as pd
+
+                    self.data_store = pd.HDFStore(values[DATA_STORE_FN], mode='r')
+                    self.data_frame = self.data_store[values[DATA_FRAME_LIST][0]]
+                    self.data_store.close()
+                    return self.data_store, self.data_frame
+
+
+class MergeSelectionGUI:
+    def __init__(self, title: str, data_frame_names: list[str]):
+        layout = [
+            [sg.Text(text='Data Frames to Merge')],
+            [sg.Listbox(values=data_frame_names, select_mode=sg.LISTBOX_SELECT_MODE_MULTIPLE,
+                        size_px=(600, 600), key=DATA_FRAME_LIST)],
+            [sg.Cancel(key=CANCEL), sg.OK(button_text='Merge Data Frames', key=MERGE)],
+        ]
+        self.window = sg.Window(title, layout, default_element_size=(12, 1), auto_size_text=False,
+                                auto_size_buttons=False,
+                                default_button_element_size=(12, 1))
+
+    def read(self) -> list[str]:
+        selected: list[str] = []
+        while True:
+            event, values = self.window.read()
+            if event == CANCEL or event == sg.WIN_CLOSED:
+                break
+            elif event == MERGE and len(values[DATA_FRAME_LIST]) > 1:
+                selected = values[DATA_FRAME_LIST]
+                break
+        self.window.close()
+        return selected
 
 
 if __name__ == '__main__':
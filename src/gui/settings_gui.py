@@ -1,16 +1,17 @@
 from os import chdir
 from pathlib import Path
-from urllib.parse import urlparse
-from urllib.request import urlopen
+from time import monotonic
 
 import PySimpleGUIQt as sg
 
+from gui.jobs import POLL_MS
 from settings.settings import (Settings,
                                TEMP_DATA_SOURCES,
                                TEMP_DATA_SOURCE_VISUAL_CROSSING,
                                TEMP_DATA_SOURCE_SC_ACIS,
                                Validator,
                                VisualCrossingSettings)
+from settings.url_checker import url_checker, UrlCheck
 
 DATA_STORE_FOLDER = 'Data Store Folder:'
 INPUT_DATA_FOLDER = 'Input Data Folder:'
@@ -32,6 +33,12 @@ ERROR_MSG = 'Error Messages'
 class BaseGUI:
     def __init__(self):
         self.window = None
+        # the fields holding URLs, their hosts are checked in the background
+        self.url_keys: list[str] = []
+        # a save held for URL checks: the fields not answered yet, when they must answer by and the values saved
+        self.save_waiting: list[str] = []
+        self.save_deadline: float = 0.0
+        self.save_values: dict | None = None
 
     def post_error_msg(self, msg: str):
         self.window.Element(ERROR_MSG).update(f'{msg}\n', append=True)
@@ -39,18 +46,78 @@ class BaseGUI:
     def clear_error_msg(self):
         self.window.Element(ERROR_MSG).update('')
 
-    def url_bad(self, key: str, url_str: str) -> bool:
-        try:
-            url_parts = Validator.url_parse(url_str)
-            try:
-                Validator.url_open(f'{url_parts.scheme}://{url_parts.netloc}')
-                return False
-            except ValueError as excep:
-                self.post_error_msg(f'{key} {excep.args[0]}')
-                return True
-        except ValueError as excep:
-            self.post_error_msg(f'{key} {excep.args[0]}')
+    def url_bad(self, key: str, url_str: str, saving: bool = False) -> bool:
+        #
+        # a URL is bad when it is badly formed or its host is known not to answer.  A host that hasn't been
+        # checked recently is checked in the background and the URL passes for now, url_events posts the answer.
+        # Saving is held until the check answers, see hold_save, so an unchecked URL is never saved.
+        #
+        check = url_checker.check(key, url_str)
+        if check is None:
+            if saving:
+                self.post_error_msg(f'{key} waiting for {url_str} to answer before saving.')
+                if key not in self.save_waiting:
+                    self.save_waiting.append(key)
+            else:
+                self.post_error_msg(f'{key} checking {url_str}.')
+            return False
+        return self.url_check_failed(check)
+
+    def url_check_failed(self, check: UrlCheck) -> bool:
+        if check.error is not None:
+            self.post_error_msg(f'{check.key} {check.error}')
             return True
+        return False
+
+    def url_events(self) -> bool:
+        #
+        # post the answers of the checks finished since the last read, True if any host didn't answer.  A held
+        # save fails the fields whose hosts haven't answered by its deadline.
+        #
+        failed = False
+        for check in url_checker.poll(self.url_keys):
+            failed = self.url_check_failed(check) or failed
+            if check.key in self.save_waiting:
+                self.save_waiting.remove(check.key)
+        if len(self.save_waiting) > 0 and monotonic() > self.save_deadline:
+            for key in self.save_waiting:
+                self.post_error_msg(f'{key} did not answer within {url_checker.timeout:g} seconds.')
+            self.save_waiting = []
+            failed = True
+        return failed
+
+    def hold_save(self, values: dict) -> bool:
+        # True when saving waits on URL checks, the read loop then finishes the save with held_save
+        if len(self.save_waiting) == 0:
+            return False
+        self.save_values = values
+        self.save_deadline = monotonic() + url_checker.timeout
+        return True
+
+    def held_save(self, error: bool) -> dict | None:
+        # the values of a held save once its URLs have answered, None while waiting or when one of them failed
+        if self.save_values is None or len(self.save_waiting) > 0:
+            return None
+        values, self.save_values = self.save_values, None
+        if error:
+            self.post_error_msg('The settings were not saved.')
+            return None
+        return values
+
+    def drop_save(self):
+        # a field edited while a save is held is validated again, the held values are no longer the ones shown
+        self.save_waiting = []
+        self.save_values = None
+
+    def read_window(self) -> tuple:
+        # wake up regularly only while URLs are being checked or a save is held, to post their answers
+        pending = url_checker.pending or self.save_values is not None
+        return self.window.read(timeout=POLL_MS if pending else None)
+
+    def close(self):
+        # answers still on their way are of no use once the window is gone
+        self.window.close()
+        url_checker.poll(self.url_keys)
 
 
 class VisualCrossingSettingsGUI(BaseGUI):
@@ -59,6 +126,7 @@ class VisualCrossingSettingsGUI(BaseGUI):
         self.vc_settings: VisualCrossingSettings = vc_settings
         self.app_folder:Path = app_folder
         self.focus_element_key:str = VC_URL
+        self.url_keys = [VC_URL]
         layout = [
             [sg.Text(text=VC_URL),
              sg.InputText(default_text=vc_settings.url,
@@ -92,7 +160,7 @@ class VisualCrossingSettingsGUI(BaseGUI):
             error = True
         return error
 
-    def on_change_validations(self, values) -> bool:
+    def on_change_validations(self, values, saving: bool = False) -> bool:
         self.clear_error_msg()
         errors: list[bool] = []
         try:
@@ -100,6 +168,8 @@ class VisualCrossingSettingsGUI(BaseGUI):
         except ValueError as excep:
             self.post_error_msg(f'{VC_URL} {excep.args[0]}')
             errors.append(True)
+        else:
+            errors.append(self.url_bad(VC_URL, values[VC_URL], saving))
         errors.append(self.check_lat_long(VC_LATITUDE, values[VC_LATITUDE]))
         errors.append(self.check_lat_long(VC_LONGITUDE, values[VC_LONGITUDE]))
         try:
@@ -110,37 +180,43 @@ class VisualCrossingSettingsGUI(BaseGUI):
         return any(errors)
 
     def on_save_validations(self, values) -> bool:
-        errors: list[bool] = [self.on_change_validations(values)]
-        if len(values[VC_URL]) > 0:
-            url_parts = urlparse(values[VC_URL])
-            url = f'{url_parts.scheme}://{url_parts.netloc}'
-            errors.append(self.url_bad(VC_URL, url))
-        return any(errors)
+        # the URL's host was checked when it was entered, saving is held for that check if it is still running
+        return self.on_change_validations(values, saving=True)
+
+    def save(self, values):
+        self.vc_settings.url = values[VC_URL]
+        self.vc_settings.latitude = float(values[VC_LATITUDE])
+        self.vc_settings.longitude = float(values[VC_LONGITUDE])
+        self.vc_settings.api_key = values[VC_API_KEY]
 
     def read(self) -> VisualCrossingSettings | None:
         self.focus_element_key = VC_URL
         error = False
         while True:
-            event, values = self.window.read()
-            if event == CANCEL or event == sg.WIN_CLOSED:
+            event, values = self.read_window()
+            if event == sg.TIMEOUT_KEY:
+                error = self.url_events() or error
+                saved_values = self.held_save(error)
+                if saved_values is not None:
+                    self.save(saved_values)
+                    break
+            elif event == CANCEL or event == sg.WIN_CLOSED:
                 self.vc_settings = None
                 break
             elif event == SAVE:
                 if not error:
                     error = self.on_save_validations(values)
-                    if not error:
-                        self.vc_settings.url = values[VC_URL]
-                        self.vc_settings.latitude = float(values[VC_LATITUDE])
-                        self.vc_settings.longitude = float(values[VC_LONGITUDE])
-                        self.vc_settings.api_key = values[VC_API_KEY]
+                    if not error and not self.hold_save(values):
+                        self.save(values)
                         break
             else:
+                self.drop_save()
                 if self.focus_element_key != self.window.FocusElement.Key:
                     error = self.on_change_validations(values)
                     self.focus_element_key = self.window.FocusElement.Key
                 else:
                     error = False
-        self.window.close()
+        self.close()
         return self.vc_settings
 
 
@@ -150,6 +226,8 @@ class SettingsGUI(BaseGUI):
         self.settings = settings
         self.app_folder = app_folder
         self.focus_element_key = DATA_STORE_FOLDER
+        self.url_keys = [POWER_USAGE_URL]
+        url_checker.ttl = settings.url_check_ttl
         layout = [
                   [sg.Text(text=DATA_STORE_FOLDER),
                    sg.InputText(default_text=self.settings.data_store_folder,
@@ -181,7 +259,7 @@ class SettingsGUI(BaseGUI):
                                 auto_size_buttons=False,
                                 default_button_element_size=(12, 1))
 
-    def on_change_validations(self, values: dict) -> bool:
+    def on_change_validations(self, values: dict, saving: bool = False) -> bool:
         self.clear_error_msg()
         errors: list[bool] = []
         try:
@@ -211,10 +289,12 @@ class SettingsGUI(BaseGUI):
         except ValueError as excep:
             self.post_error_msg(f'{TEMP_DATA_SOURCE} {excep.args[0]}.')
             errors.append(True)
+        if len(values[POWER_USAGE_URL]) > 0:
+            errors.append(self.url_bad(POWER_USAGE_URL, values[POWER_USAGE_URL], saving))
         return any(errors)
 
     def on_save_validations(self,  values: dict) -> bool:
-        errors: list[bool] = [self.on_change_validations(values)]
+        errors: list[bool] = [self.on_change_validations(values, saving=True)]
         if not any(errors):
             path: Path = Path(values[DATA_STORE_FOLDER])
             if not path.exists():
@@ -233,16 +313,28 @@ class SettingsGUI(BaseGUI):
                 else:
                     self.post_error_msg(f'{INPUT_DATA_FOLDER} does not exist and creation was declined.')
                     errors.append(True)
-        if len(values[POWER_USAGE_URL]) > 0:
-            errors.append(self.url_bad(POWER_USAGE_URL, values[POWER_USAGE_URL]))
         return any(errors)
 
+    def save(self, values: dict):
+        self.settings.data_store_folder = values[DATA_STORE_FOLDER]
+        self.settings.input_data_folder = values[INPUT_DATA_FOLDER]
+        self.settings.daily_dataframe_filter = values[DAILY_DATAFRAME_FILTER]
+        self.settings.hourly_dataframe_filter = values[HOURLY_DATAFRAME_FILTER]
+        self.settings.temp_data_source = values[TEMP_DATA_SOURCE]
+        self.settings.power_usage_url = values[POWER_USAGE_URL]
+
     def read(self) -> Settings | None:
         self.focus_element_key = DATA_STORE_FOLDER
         error = False
         while True:
-            event, values = self.window.read()
-            if event == CANCEL or event == sg.WIN_CLOSED:
+            event, values = self.read_window()
+            if event == sg.TIMEOUT_KEY:
+                error = self.url_events() or error
+                saved_values = self.held_save(error)
+                if saved_values is not None:
+                    self.save(saved_values)
+                    break
+            elif event == CANCEL or event == sg.WIN_CLOSED:
                 self.settings = None
                 break
             elif event == EDIT_TEMP_SETTINGS:
@@ -257,21 +349,17 @@ class SettingsGUI(BaseGUI):
             elif event == SAVE:
                 if not error:
                     error = self.on_save_validations(values)
-                    if not error:
-                        self.settings.data_store_folder = values[DATA_STORE_FOLDER]
-                        self.settings.input_data_folder = values[INPUT_DATA_FOLDER]
-                        self.settings.daily_dataframe_filter = values[DAILY_DATAFRAME_FILTER]
-                        self.settings.hourly_dataframe_filter = values[HOURLY_DATAFRAME_FILTER]
-                        self.settings.temp_data_source = values[TEMP_DATA_SOURCE]
-                        self.settings.power_usage_url = values[POWER_USAGE_URL]
+                    if not error and not self.hold_save(values):
+                        self.save(values)
                         break
                 else:
                     self.post_error_msg(f'You must correct errors before saving the settings.')
             else:
+                self.drop_save()
                 if self.focus_element_key != self.window.FocusElement.Key:
                     error = self.on_change_validations(values)
                     self.focus_element_key = self.window.FocusElement.Key
-        self.window.close()
+        self.close()
         return self.settings
 
 
@@ -1,5 +1,6 @@
 from collections import namedtuple
 from pathlib import Path
+from urllib.error import HTTPError, URLError
 from urllib.parse import urlparse
 from urllib.request import urlopen
 
@@ -12,6 +13,9 @@ except ImportError:
 TEMP_DATA_SOURCE_VISUAL_CROSSING = 'Visual Crossing'
 TEMP_DATA_SOURCE_SC_ACIS = 'SC ACIS'
 TEMP_DATA_SOURCES = [TEMP_DATA_SOURCE_VISUAL_CROSSING, TEMP_DATA_SOURCE_SC_ACIS]
+# seconds to wait for a host to answer, and to trust an answer before asking again
+URL_TIMEOUT = 5.0
+DEFAULT_URL_CHECK_TTL = 300.0
 
 
 class Validator:
@@ -24,10 +28,13 @@ class Validator:
             return url_parts
 
     @staticmethod
-    def url_open(url_str) -> None:
+    def url_open(url_str, timeout: float = URL_TIMEOUT) -> None:
         try:
-            urlopen(url_str)
-        except ValueError:
+            urlopen(url_str, timeout=timeout).close()
+        except HTTPError:
+            # an error status is still an answer, the host is reachable
+            return
+        except (ValueError, URLError, OSError):
             raise ValueError(f'{url_str} did not respond.')
 
     @staticmethod
@@ -174,6 +181,15 @@ class Settings:
     def power_usage_url(self, power_usage_url):
         self._data['power_usage_url'] = power_usage_url
 
+    @property
+    def url_check_ttl(self) -> float:
+        # settings files written before the setting existed use the default
+        return float(self._data.get('url_check_ttl', DEFAULT_URL_CHECK_TTL))
+
+    @url_check_ttl.setter
+    def url_check_ttl(self, url_check_ttl: float):
+        self._data['url_check_ttl'] = url_check_ttl
+
     def __repr__(self):
         return f'{self.__class__.__name__}(data={self._data})'
 
@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, SimpleQueue
+from threading import Lock
+from time import monotonic
+from typing import NamedTuple
+
+from settings.settings import DEFAULT_URL_CHECK_TTL, URL_TIMEOUT, Validator
+
+
+class UrlCheck(NamedTuple):
+    # the field the URL was entered in, the host checked and why it failed, None when it answered
+    key: str
+    host: str
+    error: str | None
+
+
+class UrlChecker:
+    #
+    # checks that the hosts of URLs answer, on worker threads so the settings dialogs don't wait on the
+    # network while fields are edited or saved.  Answers are cached per host for ttl seconds, a host already
+    # being checked is not asked again and every field waiting on it gets the answer.  Finished checks are
+    # collected with poll on the GUI thread.
+    #
+    def __init__(self, ttl: float = DEFAULT_URL_CHECK_TTL, timeout: float = URL_TIMEOUT, max_workers: int = 2):
+        self.ttl: float = ttl
+        self.timeout: float = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='url-check')
+        self._results: dict[str, tuple[float, str | None]] = {}
+        self._waiting: dict[str, list[str]] = {}
+        self._finished: SimpleQueue[UrlCheck] = SimpleQueue()
+        self._lock = Lock()
+
+    @staticmethod
+    def host(url_str: str) -> str:
+        url_parts = Validator.url_parse(url_str)
+        return f'{url_parts.scheme}://{url_parts.netloc}'
+
+    @property
+    def pending(self) -> bool:
+        # checks running, or finished and not yet collected by poll
+        with self._lock:
+            return len(self._waiting) > 0 or not self._finished.empty()
+
+    def cached(self, host: str) -> tuple[bool, str | None]:
+        # whether the host has a fresh answer, and the answer
+        with self._lock:
+            result = self._results.get(host)
+        if result is None or monotonic() - result[0] > self.ttl:
+            return False, None
+        return True, result[1]
+
+    def check(self, key: str, url_str: str) -> UrlCheck | None:
+        #
+        # the cached answer for the URL's host, or None after starting a check whose answer poll will
+        # return.  Badly formed URLs are answered at once, they never reach the network.
+        #
+        try:
+            host = self.host(url_str)
+        except ValueError as excep:
+            return UrlCheck(key, url_str, excep.args[0])
+        found, error = self.cached(host)
+        if found:
+            return UrlCheck(key, host, error)
+        with self._lock:
+            if host in self._waiting:
+                if key not in self._waiting[host]:
+                    self._waiting[host].append(key)
+                return None
+            self._waiting[host] = [key]
+            self._executor.submit(self._check, host)
+        return None
+
+    def poll(self, keys: list[str] | None = None) -> list[UrlCheck]:
+        # finished checks of the keys, or of every key, checks of other keys are left for their dialog
+        checks: list[UrlCheck] = []
+        others: list[UrlCheck] = []
+        while True:
+            try:
+                check = self._finished.get_nowait()
+            except Empty:
+                break
+            (checks if keys is None or check.key in keys else others).append(check)
+        for check in others:
+            self._finished.put(check)
+        return checks
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _check(self, host: str):
+        try:
+            Validator.url_open(host, self.timeout)
+            error = None
+        except ValueError as excep:
+            error = excep.args[0]
+        # the answers are queued before the host stops waiting, so pending never misses them
+        with self._lock:
+            self._results[host] = (monotonic(), error)
+            for key in self._waiting.pop(host, []):
+                self._finished.put(UrlCheck(key, host, error))
+
+
+# shared by the settings dialogs, so answers outlive the dialog that asked
+url_checker = UrlChecker()
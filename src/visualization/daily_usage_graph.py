@@ -1,9 +1,13 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
 
+from data_cruncher.temperature_data import AVE_TEMP_COL
+from data_cruncher.tracing import span
 from data_cruncher.usage_data import qtr_hr_times, qtr_hr_fields, DailyUsageData, DailyUsageDataFactory
-from data_type import DataType
+from visualization.data_type import DataType
+from visualization.downsample import decimate, point_budget
 
+import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import pandas as pd
 
@@ -12,36 +16,54 @@ class DailyUsageGraph:
     def __init__(self, usage_data: DailyUsageData,
                  usage_axes: plt.Axes, temp_axes: plt.Axes):
         self.usage_data: DailyUsageData = usage_data
-        self.usage_axes: plt.Axes = usage_axes
-        self.usage_axes.set_title(label='Actual Daily Usage with Temperature from '
-                                  f'{self.usage_data.from_date.strftime("%m/%d/%Y")} to '
-                                  f'{self.usage_data.to_date.strftime("%m/%d/%Y")}')
-        dates: list[datetime] = []
-        date_labels: list[str] = []
-        date = self.usage_data.from_date
-        dateinc: timedelta = timedelta(days=1)
-        while date <= self.usage_data.to_date:
-            dates.append(date)
-            date_labels.append(date.strftime('%m/%d'))
-            date = date + dateinc
-        self.usage_axes.set_xticks(dates, labels=date_labels, rotation='vertical')
-        self.usage_axes.set_ylabel('Usage in Kilowatt Hours')
-        self.usage_axes.plot('Date', 'Total', data=self.usage_data.data_frame, label='Actual Usage')
-        self.usage_axes.legend()
-        self.temp_axes: plt.Axes = temp_axes
-        self.temp_axes.set_xticks(dates, labels=date_labels, rotation='vertical')
-        self.temp_axes.set_ylabel('Temperature')
-        self.temp_axes.plot('Date', 'Average', data=self.usage_data.data_frame, label='Average Temp')
-        self.temp_axes.legend()
+        # the lines are laid out here, matplotlib draws them when the figure is rendered
+        with span('daily graph', rows=len(usage_data.data_frame)):
+            self.usage_axes: plt.Axes = usage_axes
+            self.usage_axes.set_title(label='Actual Daily Usage with Temperature from '
+                                      f'{self.usage_data.from_date.strftime("%m/%d/%Y")} to '
+                                      f'{self.usage_data.to_date.strftime("%m/%d/%Y")}')
+            # tick spacing and label format follow the range shown, from days up to years
+            usage_locator = mdates.AutoDateLocator()
+            self.usage_axes.xaxis.set_major_locator(usage_locator)
+            self.usage_axes.xaxis.set_major_formatter(mdates.ConciseDateFormatter(usage_locator))
+            self.usage_axes.set_ylabel('Usage in Kilowatt Hours')
+            # long ranges are decimated to about a point per pixel of the axes width
+            self.usage_axes.plot('Date', 'Total', label='Actual Usage',
+                                 data=decimate(self.usage_data.data_frame, 'Date', 'Total',
+                                               point_budget(self.usage_axes)))
+            self.usage_axes.legend()
+            self.temp_axes: plt.Axes = temp_axes
+            # NWS spreadsheets name the average temperature column Average, the other sources Avg.  Usage
+            # ingested without temperatures has no readings to draw and the temperature axes are hidden.
+            temp_cols = [column for column in ['Average', AVE_TEMP_COL] if column in self.usage_data.data_frame.columns
+                         and self.usage_data.data_frame[column].notna().any()]
+            if len(temp_cols) == 0:
+                self.temp_axes.set_visible(False)
+            else:
+                temp_locator = mdates.AutoDateLocator()
+                self.temp_axes.xaxis.set_major_locator(temp_locator)
+                self.temp_axes.xaxis.set_major_formatter(mdates.ConciseDateFormatter(temp_locator))
+                self.temp_axes.set_ylabel('Temperature')
+                self.temp_axes.plot('Date', temp_cols[0], label='Average Temp',
+                                    data=decimate(self.usage_data.data_frame, 'Date', temp_cols[0],
+                                                  point_budget(self.temp_axes)))
+                self.temp_axes.legend()
 
 
 if __name__ == '__main__':
+    # the temperature readers are only needed by this demonstration, not by the graph itself
+    from data_cruncher.temperature_data import TemperatureDataFactory
+
     usage_path = Path('data/power-usage.xlsx')
     temp_path = Path('data/temp-data.xlsx')
+    from_date = datetime(year=2023, month=12, day=31)
+    to_date = datetime(year=2024, month=1, day=12)
+    daily_temp_data = TemperatureDataFactory.from_nws_spreadsheet(data_path=temp_path, from_date=from_date,
+                                                                  to_date=to_date)
     daily_usage_data = DailyUsageDataFactory.from_spreadsheet(hourly_usage_path=usage_path,
-                                                              daily_temp_path=temp_path,
-                                                              from_date=datetime(year=2023, month=12, day=31),
-                                                              to_date=datetime(year=2024, month=1, day=12))
+                                                              daily_temp_data=daily_temp_data,
+                                                              from_date=from_date,
+                                                              to_date=to_date)
     fig, ax_dict = plt.subplot_mosaic([['usage_graph'], ['temp_graph']])
     dug = DailyUsageGraph(usage_data=daily_usage_data,
                           usage_axes=ax_dict['usage_graph'],
@@ -3,6 +3,6 @@ from enum import Enum, auto
 
 class DataType(Enum):
     AVERAGE = auto()
-    ACTUAL = auto
+    ACTUAL = auto()
     MIN = auto()
     MAX = auto()
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+LTTB = 'lttb'
+MIN_MAX = 'min/max'
+# never decimate below this many points, however narrow the axes
+MIN_POINTS = 64
+
+
+def point_budget(axes: plt.Axes, points_per_pixel: float = 1.0) -> int:
+    # points worth drawing across the width of the axes, more than this only overdraws the same pixels
+    width: float = axes.get_window_extent().width
+    return max(int(width * points_per_pixel), MIN_POINTS)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    #
+    # Largest Triangle Three Buckets: indices of threshold points keeping the first and last point and, from
+    # each bucket in between, the point forming the largest triangle with the previously kept point and the
+    # average of the next bucket.  Keeps peaks and troughs that averaging would flatten.
+    #
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges: np.ndarray = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype('int64') + 1
+    edges[-1] = n - 1
+    selected: np.ndarray = np.empty(threshold, dtype='int64')
+    selected[0] = 0
+    selected[-1] = n - 1
+    kept = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_start, next_stop = (edges[bucket + 1], edges[bucket + 2]) if bucket < threshold - 3 else (n - 1, n)
+        avg_x: float = x[next_start:next_stop].mean()
+        avg_y: float = y[next_start:next_stop].mean()
+        area: np.ndarray = np.abs((x[kept] - avg_x) * (y[start:stop] - y[kept]) -
+                                  (x[kept] - x[start:stop]) * (avg_y - y[kept]))
+        kept = start + int(np.argmax(area))
+        selected[bucket + 1] = kept
+    return selected
+
+
+def min_max(y: np.ndarray, threshold: int) -> np.ndarray:
+    #
+    # indices of the minimum and maximum of each of threshold / 2 equal buckets, in order.  Every bucket's
+    # vertical extent is drawn, so spikes survive however many points share a pixel column.
+    #
+    n = len(y)
+    buckets = threshold // 2
+    if threshold >= n or buckets < 1:
+        return np.arange(n)
+    size = -(-n // buckets)
+    padded: np.ndarray = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size)
+    offsets: np.ndarray = np.arange(buckets) * size
+    mins: np.ndarray = offsets + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    maxes: np.ndarray = offsets + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    selected: np.ndarray = np.union1d(mins, maxes)
+    return selected[selected < n]
+
+
+def decimate(data_frame: pd.DataFrame, x_col: str, y_col: str, threshold: int, method: str = LTTB) -> pd.DataFrame:
+    # rows of data_frame, ordered by x_col, kept to draw y_col against x_col with about threshold points
+    data_frame = data_frame[data_frame[y_col].notna()]
+    if not data_frame[x_col].is_monotonic_increasing:
+        data_frame = data_frame.sort_values(x_col, kind='stable')
+    if len(data_frame) <= threshold:
+        return data_frame
+    y: np.ndarray = data_frame[y_col].to_numpy(dtype='float64')
+    if method == MIN_MAX:
+        return data_frame.iloc[min_max(y, threshold)]
+    x: np.ndarray = data_frame[x_col].to_numpy()
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('datetime64[ns]').astype('int64')
+    return data_frame.iloc[lttb(x.astype('float64'), y, threshold)]
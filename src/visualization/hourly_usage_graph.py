@@ -1,8 +1,11 @@
 from datetime import datetime
 from pathlib import Path
 
-from data_cruncher.usage_data import qtr_hr_times, qtr_hr_fields, HourlyUsageData, HourlyUsageDataFactory
-from data_type import DataType
+from data_cruncher.tracing import span
+from data_cruncher.usage_data import (qtr_hr_times, qtr_hr_fields, with_time_of_day, HourlyUsageData,
+                                      HourlyUsageDataFactory)
+from visualization.data_type import DataType
+from visualization.downsample import decimate, point_budget, MIN_MAX
 
 import matplotlib.pyplot as plt
 
@@ -12,31 +15,37 @@ class HourlyUsageGraph:
                  axes: plt.Axes,
                  show: tuple[DataType, ...]):
         self.usage_data: HourlyUsageData = usage_data
-        self.axes: plt.Axes = axes
-        self.show = show
-        self.axes.set_title(label=f'Hourly Usage Summary: '
-                                  f'{self.usage_data.from_date.strftime("%m/%d/%Y")} to '
-                                  f'{self.usage_data.to_date.strftime("%m/%d/%Y")}')
-        self.axes.set_xlabel('Time of Day')
-        hr_times: list[datetime] = []
-        hr_labels: list[str] = []
-        for idx, time in enumerate(qtr_hr_times):
-            if time.minute == 0:
-                hr_times.append(time)
-                hr_labels.append(qtr_hr_fields[idx])
-        self.axes.set_xticks(hr_times, labels=hr_labels, rotation='vertical')
-        self.axes.tick_params(axis='x', width=20)
-        self.axes.set_ylabel('Usage in Kilowatt Hours')
-        if DataType.MAX in self.show:
-            self.axes.plot('time', 'usage', data=self.usage_data.max(), label='Max')
-        if DataType.MIN in self.show:
-            self.axes.plot('time', 'usage', data=self.usage_data.min(), label='Min')
-        if DataType.AVERAGE in self.show:
-            self.axes.plot('time', 'usage', data=self.usage_data.mean(), label='Average')
-        if DataType.ACTUAL in self.show:
-            self.axes.plot('time', 'usage', data=self.usage_data.actual(), label='Actual')
-        self.axes.legend()
-        self.axes.plot()
+        # the lines are laid out here, matplotlib draws them when the figure is rendered
+        with span('hourly graph', rows=usage_data.rows):
+            self.axes: plt.Axes = axes
+            self.show = show
+            self.axes.set_title(label=f'Hourly Usage Summary: '
+                                      f'{self.usage_data.from_date.strftime("%m/%d/%Y")} to '
+                                      f'{self.usage_data.to_date.strftime("%m/%d/%Y")}')
+            self.axes.set_xlabel('Time of Day')
+            hr_times: list[datetime] = []
+            hr_labels: list[str] = []
+            for idx, time in enumerate(qtr_hr_times):
+                if time.minute == 0:
+                    hr_times.append(time)
+                    hr_labels.append(qtr_hr_fields[idx])
+            self.axes.set_xticks(hr_times, labels=hr_labels, rotation='vertical')
+            self.axes.tick_params(axis='x', width=20)
+            self.axes.set_ylabel('Usage in Kilowatt Hours')
+            # the frames number their intervals, the times of day are only added to the rows drawn
+            if DataType.MAX in self.show:
+                self.axes.plot('time', 'usage', data=with_time_of_day(self.usage_data.max()), label='Max')
+            if DataType.MIN in self.show:
+                self.axes.plot('time', 'usage', data=with_time_of_day(self.usage_data.min()), label='Min')
+            if DataType.AVERAGE in self.show:
+                self.axes.plot('time', 'usage', data=with_time_of_day(self.usage_data.mean()), label='Average')
+            if DataType.ACTUAL in self.show:
+                # every day's readings share the 96 times of day, draw the envelope of each pixel column
+                actual_df = decimate(self.usage_data.actual(), 'interval', 'usage', point_budget(self.axes, 2.0),
+                                     MIN_MAX)
+                self.axes.plot('time', 'usage', data=with_time_of_day(actual_df), label='Actual')
+            self.axes.legend()
+            self.axes.plot()
 
 
 if __name__ == '__main__':
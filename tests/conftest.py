@@ -0,0 +1,5 @@
+from pathlib import Path
+import sys
+
+# the packages live under src, as they do for main.py
+sys.path.insert(0, Path(__file__).parent.parent.joinpath('src').__str__())
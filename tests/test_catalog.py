@@ -0,0 +1,60 @@
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_usage
+from data_cruncher.catalog import DataStoreCatalog, KIND_DAILY, KIND_HOURLY
+from data_cruncher.usage_data import DailyUsageDataFactory, HourlyUsageDataFactory, qtr_hr_fields
+
+FROM_DATE = datetime(year=2023, month=12, day=14)
+TO_DATE = datetime(year=2024, month=1, day=12)
+HOURLY_NAME = 'Hourly-12/14/2023-01/12/2024'
+DAILY_NAME = 'Daily-12/14/2023-01/12/2024'
+
+
+def write_baseline_store(datastore_path: Path):
+    #
+    # a data store as the first release wrote it: fixed format frames, the hourly frame holding a time of day on
+    # the day it was built rather than the date of each reading, and its type as strings
+    #
+    usage_df = synthetic_usage(30 / 365)
+    times = pd.date_range('2024-03-01', periods=len(qtr_hr_fields), freq='15min')
+    values = usage_df[qtr_hr_fields].to_numpy()
+    actual = ~np.isnan(values.T)
+    hourly_df = pd.concat([pd.DataFrame({'time': np.repeat(times, actual.sum(axis=1)), 'usage': values.T[actual],
+                                         'type': 'actual'})] +
+                          [pd.DataFrame({'time': times, 'usage': stat(values, axis=0), 'type': name})
+                           for name, stat in [('min', np.nanmin), ('mean', np.nanmean), ('max', np.nanmax)]],
+                          ignore_index=True)
+    daily_df = usage_df[['Date', 'Total']].assign(Average=50.0)
+    with pd.HDFStore(datastore_path.__str__()) as ds:
+        ds[HOURLY_NAME] = hourly_df
+        ds[DAILY_NAME] = daily_df
+
+
+def test_rebuild_baseline_store(tmp_path: Path):
+    datastore_path = tmp_path.joinpath('baseline.h5')
+    write_baseline_store(datastore_path)
+    catalog = DataStoreCatalog(datastore_path)
+    catalog.rebuild()
+    hourly = catalog.get(HOURLY_NAME)
+    daily = catalog.get(DAILY_NAME)
+    assert (hourly.kind, hourly.from_date, hourly.to_date) == (KIND_HOURLY, FROM_DATE, TO_DATE)
+    assert (daily.kind, daily.from_date, daily.to_date, daily.rows) == (KIND_DAILY, FROM_DATE, TO_DATE, 30)
+    assert DataStoreCatalog(datastore_path).keys() == [DAILY_NAME, HOURLY_NAME]
+
+
+def test_read_baseline_store(tmp_path: Path):
+    datastore_path = tmp_path.joinpath('baseline.h5')
+    write_baseline_store(datastore_path)
+    DataStoreCatalog(datastore_path).rebuild()
+    daily_usage_data = DailyUsageDataFactory.from_datastore(datastore_path, DAILY_NAME,
+                                                            datetime(year=2024, month=1, day=1), TO_DATE)
+    assert len(daily_usage_data.data_frame) == 12
+    merged = DailyUsageDataFactory.from_datastore_merged(datastore_path, [DAILY_NAME, DAILY_NAME])
+    assert len(merged.data_frame) == 30
+    hourly_usage_data = HourlyUsageDataFactory.from_datastore(datastore_path, HOURLY_NAME)
+    assert len(hourly_usage_data.mean()) == len(qtr_hr_fields)
+    assert hourly_usage_data.actual()['Date'].isna().all()